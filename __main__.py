@@ -1,4 +1,67 @@
-from .main import main
+import argparse
+from .game import parse_clock
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="rapid_project")
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="run the simulation without pygame as fast as possible",
+    )
+    parser.add_argument(
+        "--until",
+        default="24:00",
+        type=parse_clock,
+        help="simulated time (HH:MM) at which a headless run stops",
+    )
+    parser.add_argument(
+        "--fleet",
+        action="store_true",
+        help="update trains with the vectorised TrainFleet engine",
+    )
+    parser.add_argument(
+        "--skip-idle",
+        action="store_true",
+        help="jump the clock to the next departure while nothing is moving",
+    )
+    parser.add_argument(
+        "--full-redraw",
+        action="store_true",
+        help="redraw and flip the whole screen every frame",
+    )
+    parser.add_argument(
+        "--speed",
+        default=1,
+        type=int,
+        choices=(1, 2, 5, 10, 30, 60),
+        help="initial simulation speed multiplier (keys 1-6 change it)",
+    )
+    parser.add_argument(
+        "--threaded",
+        action="store_true",
+        help="run the simulation in a separate process and draw its snapshots",
+    )
+    parser.add_argument(
+        "--record",
+        metavar="FILE",
+        help="record every tick of the run to FILE",
+    )
+    parser.add_argument(
+        "--replay",
+        metavar="FILE",
+        help="play back a recording without running the simulation",
+    )
+    return parser.parse_args()
+
 
 if __name__ == "__main__":
-    main()
+    args = _parse_args()
+    if args.headless:
+        from .headless import main as headless_main
+
+        headless_main(args.until, args.fleet, args.skip_idle, args.record)
+    else:
+        from .main import main
+
+        main(args.full_redraw, args.speed, args.threaded, args.record, args.replay)
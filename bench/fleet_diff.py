@@ -0,0 +1,103 @@
+import argparse
+import time
+from ..game import Game, Time
+from ..core.fleet import TrainFleet
+from ..core.enums import TrainSituation
+
+
+# ダイヤの各列車を copies 本ずつ複製した Game を作る
+def build_game(copies: int, use_fleet: bool) -> Game:
+    game = Game()
+    trains = [
+        train
+        for _ in range(copies)
+        for train in game._create_train(
+            game.timetable_file["train"], game.timetable_index
+        )
+    ]
+    game.set_trains(trains, use_fleet)
+    return game
+
+
+def object_state(game: Game) -> list[tuple[int, ...]]:
+    return [
+        (
+            train.curr_unit.uid,
+            train.curr_index,
+            int(train.curr_speed),
+            train.speed_limit,
+            train.process_time,
+            train.direction.value,
+            train.situation is TrainSituation.MOVING,
+        )
+        for train in game.trains
+    ]
+
+
+def fleet_state(fleet: TrainFleet) -> list[tuple[int, ...]]:
+    columns = (
+        fleet.uid,
+        fleet.index,
+        fleet.speed,
+        fleet.speed_limit,
+        fleet.process_time,
+        fleet.direction,
+        fleet.moving,
+    )
+    return [tuple(int(value) for value in row) for row in zip(*columns)]
+
+
+def line_state(game: Game) -> tuple[bytes, ...]:
+    graph = game.line.graph
+    situations = bytes(unit.situation.value for unit in graph.units)
+    return (situations, graph.up_sign.tobytes(), graph.down_sign.tobytes())
+
+
+def run(game: Game, until_minutes: int) -> float:
+    clock = Time()
+    tick = 0
+    start = time.perf_counter()
+    while clock.curr_minutes < until_minutes:
+        tick += 1
+        clock.update(tick)
+        game.update(tick, clock.curr_minutes)
+    return time.perf_counter() - start
+
+
+# 1 tick ごとに Train オブジェクト版と TrainFleet 版の状態を比較する
+def compare(copies: int, until_minutes: int) -> int:
+    reference = build_game(copies, False)
+    candidate = build_game(copies, True)
+    fleet = candidate.fleet
+    assert fleet is not None
+    clock = Time()
+    tick = 0
+    while clock.curr_minutes < until_minutes:
+        tick += 1
+        clock.update(tick)
+        reference.update(tick, clock.curr_minutes)
+        candidate.update(tick, clock.curr_minutes)
+        if object_state(reference) != fleet_state(fleet):
+            raise AssertionError(f"train state diverged at tick {tick}")
+        if line_state(reference) != line_state(candidate):
+            raise AssertionError(f"unit state diverged at tick {tick}")
+    return tick
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="rapid_project.bench.fleet_diff")
+    parser.add_argument("--copies", type=int, default=50)
+    parser.add_argument("--until", type=int, default=400, help="minutes")
+    args = parser.parse_args()
+
+    ticks = compare(args.copies, args.until)
+    print(f"OK: {ticks} ticks identical for {args.copies} copies")
+    for use_fleet in (False, True):
+        game = build_game(args.copies, use_fleet)
+        elapsed = run(game, args.until)
+        name = "TrainFleet" if use_fleet else "Train objects"
+        print(f"{name:14}: {ticks / elapsed:10,.0f} ticks/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import argparse
+import tracemalloc
+from typing import Any, Callable
+from ..config_schema import SCHEMA_LINE, load_and_validate
+from ..core.module import Line
+from ..core.type_hint import LineFile
+
+
+# 試験用の長い路線: crossing と normal を交互に並べる
+def synthetic_line(junctions: int, length: int) -> LineFile:
+    sections: list[dict[str, Any]] = [
+        {"unit_type": "start", "start_coord": [[0, 300], [0, 360]]},
+        {"unit_type": "normal", "length": length},
+    ]
+    for _ in range(junctions):
+        sections.append({"unit_type": "crossing", "vector": [180, 60]})
+        sections.append({"unit_type": "normal", "length": length})
+    sections.append({"unit_type": "end"})
+    line_file: Any = {
+        "sections": sections,
+        "stations": [{"name": "Stn", "sect_index": 1}],
+    }
+    return line_file
+
+
+# 旧モデル: 1ピクセルごとに座標タプルを持つ list
+def legacy_rails(line: Line) -> list[list[tuple[float, float]]]:
+    return [list(unit.rail) for section in line.sections for unit in section.units]
+
+
+def compact_rails(line: Line) -> list[Any]:
+    return [unit.rail for section in line.sections for unit in section.units]
+
+
+def measure(build: Callable[[], Any]) -> tuple[int, Any]:
+    tracemalloc.start()
+    result = build()
+    (size, _) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (size, result)
+
+
+def report(name: str, line_file: LineFile) -> None:
+    (_, line) = measure(lambda: Line(line_file))
+    pixels = sum(len(rail) for rail in compact_rails(line))
+    # rail を作り直して、そのぶんのメモリだけを計測する
+    (legacy, _) = measure(lambda: legacy_rails(line))
+    (compact, _) = measure(lambda: Line(line_file))
+    print(f"{name}: {pixels:,} rail points")
+    print(f"  legacy list[tuple] rails: {legacy / 1024:10.1f} KiB")
+    print(f"  compact Line (all units) : {compact / 1024:10.1f} KiB")
+    print(f"  legacy bytes / point     : {legacy / pixels:10.1f}")
+    print(f"  compact bytes / point    : {compact / pixels:10.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="rapid_project.bench.rail_memory")
+    parser.add_argument("--junctions", type=int, default=200)
+    parser.add_argument("--length", type=int, default=2000)
+    args = parser.parse_args()
+
+    report("line.json", load_and_validate("line.json", SCHEMA_LINE))
+    report(
+        f"synthetic ({args.junctions} crossings, normal length {args.length})",
+        synthetic_line(args.junctions, args.length),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import argparse
+import os
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+import pygame  # noqa: E402
+from ..main import Main  # noqa: E402
+from ..simulation import Simulation  # noqa: E402
+from ..view.drawer import Drawer, SignalDrawer  # noqa: E402
+from .fleet_diff import build_game  # noqa: E402
+
+
+# 列車を copies 倍にして、--at から frames tick 分を 1 tick 1 フレームで描いたときの
+# フレームレートを測る (シミュレーションの時間は含めない)
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="rapid_project.bench.render")
+    parser.add_argument("--copies", type=int, default=100)
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--at", type=int, default=365, help="minutes")
+    parser.add_argument("--offset", type=int, default=0, help="camera offset_x")
+    parser.add_argument("--zoom", type=int, default=0, help="camera zoom level")
+    parser.add_argument(
+        "--lod-cars",
+        type=int,
+        default=Drawer.LOD_CARS,
+        help="visible cars above which cars are written as pixels",
+    )
+    parser.add_argument("--full-redraw", action="store_true")
+    args = parser.parse_args()
+
+    Drawer.LOD_CARS = args.lod_cars
+    sim = Main(args.full_redraw)
+    game = build_game(args.copies, False)
+    sim.simulation = Simulation(game)
+    sim.drawer = Drawer(
+        sim.screen,
+        sim.camera,
+        game.line,
+        [train.color for train in game.trains],
+        game.track_poses(Drawer.CAR_OFFSETS),
+    )
+    sim.signal_drawer = SignalDrawer(
+        sim.screen, sim.camera, game.line, game.starting_control, game.terminal_control
+    )
+    for _ in range(args.zoom):
+        sim.camera.zoom_out()
+    sim.camera.offset_x = min(args.offset, sim.camera.max_offset)
+    while sim.simulation.time.curr_minutes < args.at:
+        sim.simulation.step()
+
+    elapsed = 0.0
+    for _ in range(args.frames):
+        sim.simulation.step()
+        start = time.perf_counter()
+        sim._render()
+        elapsed += time.perf_counter() - start
+    cars = 3 * len(game.trains)
+    mode = "full redraw" if args.full_redraw else "dirty rects"
+    zoom = f"zoom 1/{1 << sim.camera.zoom_level}"
+    print(f"{cars} cars, {mode}, {zoom}: {args.frames / elapsed:,.1f} frames/sec")
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,19 @@
-from jsonschema import validate, ValidationError
-from typing import Any, Optional, cast
+from jsonschema import ValidationError
+from jsonschema.exceptions import best_match
+from jsonschema.protocols import Validator
+from jsonschema.validators import validator_for
+from importlib.metadata import version
+from typing import Any, Iterable, Iterator, Optional, cast
+import argparse
+import hashlib
+import heapq
 import json
 from pathlib import Path
-from .core.type_hint import LineFile, TimetableFile
-from .core.module import Line
+from .core.type_hint import LineFile, PatternDef, TimetableEntry, TimetableFile
+from .core.module import Line, first_departure
+from .core.periodic import expand_run, last_number, run_count, runs_of
+from .line_cache import load_line, cache_dir
+from .json_stream import JsonObjectStream
 
 
 # ---- line.json のスキーマ ----
@@ -93,6 +103,29 @@ SCHEMA_LINE: dict[str, Any] = {
 }
 
 
+# ---- 停車駅 1 つ分のスキーマ (timetable / patterns で共通) ----
+SCHEMA_SCHEDULE_ITEM: dict[str, Any] = {
+    "type": "object",
+    "required": ["station", "track"],
+    "properties": {
+        "station": {"type": "string", "minLength": 1},
+        "track": {"type": "integer", "minimum": 0},
+        "arr_time": {
+            "type": "integer",
+            "minimum": 0,
+            "maximum": 1439,
+        },
+        "dep_time": {
+            "type": "integer",
+            "minimum": 0,
+            "maximum": 1439,
+        },
+        "direction": {"enum": ["FORWARD", "BACKWARD"]},
+    },
+    "additionalProperties": False,
+}
+
+
 # ---- timetable.json のスキーマ ----
 SCHEMA_TIMETABLE: dict[str, Any] = {
     "type": "object",
@@ -131,26 +164,41 @@ SCHEMA_TIMETABLE: dict[str, Any] = {
                     "schedule": {
                         "type": "array",
                         "minItems": 1,
-                        "items": {
-                            "type": "object",
-                            "required": ["station", "track"],
-                            "properties": {
-                                "station": {"type": "string", "minLength": 1},
-                                "track": {"type": "integer", "minimum": 0},
-                                "arr_time": {
-                                    "type": "integer",
-                                    "minimum": 0,
-                                    "maximum": 1439,
-                                },
-                                "dep_time": {
-                                    "type": "integer",
-                                    "minimum": 0,
-                                    "maximum": 1439,
-                                },
-                                "direction": {"enum": ["FORWARD", "BACKWARD"]},
-                            },
-                            "additionalProperties": False,
-                        },
+                        "items": SCHEMA_SCHEDULE_ITEM,
+                    },
+                },
+                "additionalProperties": False,
+            },
+        },
+        # 等間隔のダイヤ (schedule の時刻は start からの分、進路設定は自動で作る)
+        "patterns": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": [
+                    "trains",
+                    "first_number",
+                    "start",
+                    "end",
+                    "interval",
+                    "schedule",
+                ],
+                "properties": {
+                    "trains": {
+                        "type": "array",
+                        "minItems": 1,
+                        "items": {"type": "string", "minLength": 1},
+                    },
+                    "first_number": {"type": "integer", "minimum": 0},
+                    # 偶奇 (上り下り) を変えないよう偶数
+                    "number_step": {"type": "integer", "minimum": 2, "multipleOf": 2},
+                    "start": {"type": "integer", "minimum": 1, "maximum": 1439},
+                    "end": {"type": "integer", "minimum": 1, "maximum": 1439},
+                    "interval": {"type": "integer", "minimum": 1},
+                    "schedule": {
+                        "type": "array",
+                        "minItems": 2,
+                        "items": SCHEMA_SCHEDULE_ITEM,
                     },
                 },
                 "additionalProperties": False,
@@ -192,24 +240,209 @@ def _pretty_error(e: ValidationError, file_name: str) -> str:
     return f"[{file_name}] Schema validation error at {loc}: {e.message}"
 
 
-def load_and_validate(file_name: str, schema: dict[str, Any]) -> Any:
+# スキーマごとに一度だけ作ったバリデータ (スキーマ自体の検査も一度だけ)
+_validators: dict[int, tuple[dict[str, Any], Validator]] = {}
+
+
+def get_validator(schema: dict[str, Any]) -> Validator:
+    entry = _validators.get(id(schema))
+    if entry is None:
+        cls = validator_for(schema)
+        cls.check_schema(schema)
+        entry = (schema, cls(schema))
+        _validators[id(schema)] = entry
+    return entry[1]
+
+
+# 内容・スキーマ・jsonschema のバージョンが同じファイルは、検証済みなら検証を省く
+def _validated_marker(content_digest: str, schema: dict[str, Any]) -> Path:
+    digest = hashlib.sha256(content_digest.encode())
+    digest.update(json.dumps(schema, sort_keys=True).encode())
+    digest.update(version("jsonschema").encode())
+    return cache_dir() / "validated" / digest.hexdigest()
+
+
+def _mark_validated(marker: Path) -> None:
+    try:
+        marker.parent.mkdir(parents=True, exist_ok=True)
+        marker.touch()
+    except OSError:
+        pass
+
+
+def load_and_validate(
+    file_name: str, schema: dict[str, Any], all_errors: bool = False
+) -> Any:
     json_path = Path(__file__).resolve().parent / file_name
     if not json_path.exists():
         raise FileNotFoundError(f"JSON file not found: {json_path}")
+    content = json_path.read_bytes()
     try:
-        with json_path.open("r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = json.loads(content.decode("utf-8"))
     except json.JSONDecodeError as e:
         raise ValueError(f"Invalid JSON in {json_path}: {e}") from e
-    try:
-        validate(instance=data, schema=schema)
-    except ValidationError as e:
-        raise ValueError(_pretty_error(e, file_name)) from e
+    marker = _validated_marker(hashlib.sha256(content).hexdigest(), schema)
+    if marker.exists():
+        return data
+    _raise_errors(get_validator(schema).iter_errors(data), file_name, all_errors)
+    _mark_validated(marker)
     return data
 
 
+def _raise_errors(
+    errors: Iterable[ValidationError], file_name: str, all_errors: bool
+) -> None:
+    if all_errors:
+        # 全てのエラーを 1 回の走査でまとめて報告する
+        messages = [_pretty_error(e, file_name) for e in errors]
+        if messages:
+            raise ValueError("\n".join(messages))
+    else:
+        error = best_match(errors)
+        if error is not None:
+            raise ValueError(_pretty_error(error, file_name)) from error
+
+
+def _file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(JsonObjectStream.CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# timetable.json を先頭から順に読み、ダイヤを 1 件ずつ検証しながら train_id ごとの索引を作る
+# 索引の各リストはファイル中の順番を保つ
+def load_timetable(
+    file_name: str = "timetable.json", all_errors: bool = False
+) -> tuple[TimetableFile, dict[str, list[TimetableEntry]]]:
+    json_path = Path(__file__).resolve().parent / file_name
+    if not json_path.exists():
+        raise FileNotFoundError(f"JSON file not found: {json_path}")
+    marker = _validated_marker(_file_digest(json_path), SCHEMA_TIMETABLE)
+    validate = not marker.exists()
+    entry_validator = get_validator(
+        SCHEMA_TIMETABLE["properties"]["timetable"]["items"]
+    )
+
+    data: dict[str, Any] = {}
+    entries: list[TimetableEntry] = []
+    index: dict[str, list[TimetableEntry]] = {}
+    errors: list[ValidationError] = []
+    try:
+        with json_path.open("rb") as f:
+            stream = JsonObjectStream(f)
+            for key, position, value in stream.members(frozenset({"timetable"})):
+                if position is None:
+                    data[key] = value
+                    continue
+                if validate:
+                    entry_errors = list(entry_validator.iter_errors(value))
+                    for e in entry_errors:
+                        e.path.extendleft((position, key))
+                    if entry_errors and not all_errors:
+                        _raise_errors(entry_errors, file_name, all_errors)
+                    errors.extend(entry_errors)
+                entries.append(value)
+                if isinstance(value, dict) and isinstance(value.get("train_id"), str):
+                    index.setdefault(value["train_id"], []).append(
+                        cast(TimetableEntry, value)
+                    )
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON in {json_path}: {e}") from e
+
+    if validate:
+        # ダイヤ以外は小さいので、ダイヤの中身を除いた骨組みをまとめて検証する
+        # 配列でない "timetable" はそのまま残っているので、ここでエラーになる
+        skeleton = data
+        if "timetable" in stream.streamed:
+            skeleton = {**data, "timetable": []}
+        errors.extend(get_validator(SCHEMA_TIMETABLE).iter_errors(skeleton))
+        _raise_errors(errors, file_name, all_errors)
+        _mark_validated(marker)
+    if "timetable" in stream.streamed:
+        data["timetable"] = entries
+    return (cast(TimetableFile, data), index)
+
+
+def _check_entry(
+    entry: TimetableEntry, train_ids: set[str], tracks_per_station: dict[str, int]
+) -> None:
+    if entry["train_id"] not in train_ids:
+        raise ValueError(f"Unknown train_id in timetable: {entry['train_id']}")
+    last_time = -1
+    for stop in entry["schedule"]:
+        stn = stop["station"]
+        if stn not in tracks_per_station:
+            raise ValueError(f"Unknown station in schedule: {stn}")
+        if not (0 <= stop["track"] < tracks_per_station[stn]):
+            raise ValueError(f"track out of range at {stn}: {stop['track']}")
+        # direction required where dep_time exists
+        if (
+            "dep_time" in stop
+            and stop["dep_time"] is not None
+            and not stop.get("direction")
+        ):
+            raise ValueError(f"direction required at departure: {stn}")
+        # simple non-decreasing time checks (ignore overnight)
+        for key in ("arr_time", "dep_time"):
+            t_ = cast(Optional[int], stop.get(key))
+            if t_ is not None:
+                if last_time > t_:
+                    raise ValueError(f"Non-monotonic time at {stn}: {key}")
+                last_time = t_
+        if stop.get("arr_time") is not None and stop.get("dep_time") is not None:
+            if stop["arr_time"] > stop["dep_time"]:
+                raise ValueError(f"arr_time > dep_time at {stn}")
+
+
+# train_id の運用の各ダイヤの (番号, 停車駅の数, 始発の (駅, 番線), 終着の (駅, 番線))
+# PeriodicTimetable.roster と同じ順 (始発の発車時刻順、同時刻なら明示したダイヤ、パターンの順)
+def _roster_seams(
+    entries: list[TimetableEntry], patterns: list[PatternDef], train_id: str
+) -> Iterator[tuple[int, int, tuple[str, int], tuple[str, int]]]:
+    def ends(
+        items: Iterable[tuple[int, TimetableEntry, int]],
+    ) -> Iterator[tuple[int, tuple[int, int, tuple[str, int], tuple[str, int]]]]:
+        for dep_time, entry, number in items:
+            schedule = entry["schedule"]
+            (first, last) = (schedule[0], schedule[-1])
+            yield (
+                dep_time,
+                (
+                    number,
+                    len(schedule),
+                    (first["station"], first["track"]),
+                    (last["station"], last["track"]),
+                ),
+            )
+
+    # パターンの k 本目は、最初の列車と同じ停車駅を k * interval 遅れて発車する
+    def runs(pattern: PatternDef) -> Iterator[tuple[int, TimetableEntry, int]]:
+        base = expand_run(pattern, 0)
+        dep_time = first_departure(base)
+        step = pattern.get("number_step", 2)
+        for k in runs_of(pattern, train_id)[0]:
+            yield (
+                dep_time + pattern["interval"] * k,
+                base,
+                pattern["first_number"] + step * k,
+            )
+
+    sources = [
+        ends(
+            (first_departure(entry), entry, entry["number"])
+            for entry in sorted(entries, key=first_departure)
+        )
+    ]
+    for pattern in patterns:
+        sources.append(ends(runs(pattern)))
+    return (item for (_, item) in heapq.merge(*sources, key=lambda item: item[0]))
+
+
 # 追加の「意味的」チェック（スキーマでは表現しづらい整合性）
-def semantic_checks(line_data: LineFile, tt_data: TimetableFile) -> None:
+# 検査に使った Line を返すので、呼び出し側で作り直す必要はない
+def semantic_checks(line_data: LineFile, tt_data: TimetableFile) -> Line:
     # Basic station checks
     names = [s["name"] for s in line_data["stations"]]
     if len(names) != len(set(names)):
@@ -220,7 +453,7 @@ def semantic_checks(line_data: LineFile, tt_data: TimetableFile) -> None:
             raise ValueError(f"Station sect_index out of range: {s}")
 
     # Build topology for track counts
-    line = Line(line_data)
+    line = load_line(line_data)
     tracks_per_station = {name: len(units) for name, units in line.stations.items()}
 
     # Train definitions
@@ -235,33 +468,72 @@ def semantic_checks(line_data: LineFile, tt_data: TimetableFile) -> None:
     # Timetable entries
     tt_numbers = set()
     for entry in tt_data["timetable"]:
-        if entry["train_id"] not in train_ids:
-            raise ValueError(f"Unknown train_id in timetable: {entry['train_id']}")
         tt_numbers.add(entry["number"])
-        last_time = -1
-        for stop in entry["schedule"]:
-            stn = stop["station"]
-            if stn not in tracks_per_station:
-                raise ValueError(f"Unknown station in schedule: {stn}")
-            if not (0 <= stop["track"] < tracks_per_station[stn]):
-                raise ValueError(f"track out of range at {stn}: {stop['track']}")
-            # direction required where dep_time exists
-            if (
-                "dep_time" in stop
-                and stop["dep_time"] is not None
-                and not stop.get("direction")
-            ):
-                raise ValueError(f"direction required at departure: {stn}")
-            # simple non-decreasing time checks (ignore overnight)
-            for key in ("arr_time", "dep_time"):
-                t_ = cast(Optional[int], stop.get(key))
-                if t_ is not None:
-                    if last_time > t_:
-                        raise ValueError(f"Non-monotonic time at {stn}: {key}")
-                    last_time = t_
-            if stop.get("arr_time") is not None and stop.get("dep_time") is not None:
-                if stop["arr_time"] > stop["dep_time"]:
-                    raise ValueError(f"arr_time > dep_time at {stn}")
+        _check_entry(entry, train_ids, tracks_per_station)
+
+    # Patterns: every run shares the stops of the pattern and only shifts in
+    # time, so checking the first and the last run covers all of them
+    blocks: list[tuple[int, int, int]] = []
+    for pattern in tt_data.get("patterns", []):
+        if pattern["end"] < pattern["start"]:
+            raise ValueError(f"Pattern ends before it starts: {pattern['start']}")
+        # runs are assigned to the trains in turn, so every listed train runs
+        for train_id in pattern["trains"]:
+            if train_id not in train_ids:
+                raise ValueError(f"Unknown train_id in pattern: {train_id}")
+        for k in (0, run_count(pattern) - 1):
+            run = expand_run(pattern, k)
+            _check_entry(run, train_ids, tracks_per_station)
+            for stop in run["schedule"]:
+                for key in ("arr_time", "dep_time"):
+                    if (stop.get(key) or 0) > 1439:
+                        raise ValueError(f"Pattern runs past midnight: {run['number']}")
+            starting, terminal = run["schedule"][0], run["schedule"][-1]
+            if run["number"] % 2 == 0:
+                starting, terminal = terminal, starting
+            if not (0 <= starting["track"] < 4):  # layout-specific: 4-track starter
+                raise ValueError(
+                    f"Pattern starting track out of range: {run['number']}"
+                )
+            if not (0 <= terminal["track"] < 2):  # layout-specific: 2-track terminal
+                raise ValueError(
+                    f"Pattern terminal track out of range: {run['number']}"
+                )
+        first, last = pattern["first_number"], last_number(pattern)
+        step = pattern.get("number_step", 2)
+        for n in tt_numbers:
+            if first <= n <= last and (n - first) % step == 0:
+                raise ValueError(f"Pattern number already in timetable: {n}")
+        # interleaved blocks (e.g. odd down runs and even up runs) may share a
+        # range; only a number in both progressions collides
+        for other_first, other_last, other_step in blocks:
+            low, high = max(first, other_first), min(last, other_last)
+            start = first + -(-(low - first) // step) * step
+            for n in range(start, high + 1, step):
+                if (n - other_first) % other_step == 0:
+                    raise ValueError(f"Pattern numbers overlap: {n}")
+        blocks.append((first, last, step))
+
+    # Rosters: entries of one train, written out or pattern runs, chain
+    # end-to-start in order of first departure. Every run of a pattern has the
+    # same stops, so the seams are walked without expanding the runs
+    rosters: dict[str, list[TimetableEntry]] = {}
+    for entry in tt_data["timetable"]:
+        rosters.setdefault(entry["train_id"], []).append(entry)
+    for train_id in sorted(train_ids):
+        seams = _roster_seams(
+            rosters.get(train_id, []), tt_data.get("patterns", []), train_id
+        )
+        prev = None
+        for curr in seams:
+            if prev is not None:
+                if prev[1] < 2 or curr[1] < 2:
+                    raise ValueError(f"Rostered entry needs two stops: {train_id}")
+                if prev[3] != curr[2]:
+                    raise ValueError(
+                        f"Roster of {train_id} breaks between {prev[0]} and {curr[0]}"
+                    )
+            prev = curr
 
     # Interlocking route orders reference valid numbers and tracks
     for item in tt_data["starting_stn"]:
@@ -274,12 +546,20 @@ def semantic_checks(line_data: LineFile, tt_data: TimetableFile) -> None:
             raise ValueError(f"terminal_stn.number not in timetable: {item}")
         if not (0 <= item["track"] < 2):  # layout-specific: 2-track terminal
             raise ValueError(f"terminal_stn.track out of range: {item}")
+    return line
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="rapid_project.config_schema")
+    parser.add_argument(
+        "--all-errors",
+        action="store_true",
+        help="report every schema error instead of the most relevant one",
+    )
+    args = parser.parse_args()
     try:
-        line: LineFile = load_and_validate("line.json", SCHEMA_LINE)
-        tt: TimetableFile = load_and_validate("timetable.json", SCHEMA_TIMETABLE)
+        line: LineFile = load_and_validate("line.json", SCHEMA_LINE, args.all_errors)
+        (tt, _) = load_timetable("timetable.json", args.all_errors)
         semantic_checks(line, tt)
         print("OK: line.json / timetable.json are valid.")
     except Exception as e:
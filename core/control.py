@@ -1,4 +1,4 @@
-from typing import cast
+from typing import Sequence, cast
 from .enums import Sign, UnitSituation
 from .type_hint import SectionLike
 from .module import CrossingSection
@@ -6,10 +6,10 @@ from .module import CrossingSection
 
 class Starting4TrackControl:  # 0:merge, 1:normal, 2:crossing, 3:normal
     def __init__(
-        self, sections: list[SectionLike], timetable: list[dict[str, int]]
+        self, sections: list[SectionLike], timetable: Sequence[dict[str, int]]
     ) -> None:
         self.sections: list[SectionLike] = [sections[i] for i in range(2, 6)]
-        self.timetable: list[dict[str, int]] = timetable
+        self.timetable: Sequence[dict[str, int]] = timetable
         self.progress: int = 0
         self.arr_track: int = 0
 
@@ -39,6 +39,20 @@ class Starting4TrackControl:  # 0:merge, 1:normal, 2:crossing, 3:normal
             self._cleared_to_arr()
         self.progress += 1
 
+    # 次の update で状態を変える処理があるか
+    def has_pending_work(self) -> bool:
+        for i in range(4):
+            unit = self.sections[0].units[i]
+            if unit.situation is UnitSituation.OCCUPIED and unit.down_sign != Sign.RED:
+                return True
+        for i in range(1, 3):
+            unit = self.sections[2].units[i]
+            if unit.situation is UnitSituation.OCCUPIED and unit.up_sign != Sign.RED:
+                return True
+        if self.progress > len(self.timetable) - 1:
+            return False
+        return self._check_pass_allowed()
+
     def _cleared_for_dep(self) -> None:
         schedule = self.timetable[self.progress]
         if schedule["track"] < 2:
@@ -119,10 +133,10 @@ class Starting4TrackControl:  # 0:merge, 1:normal, 2:crossing, 3:normal
 
 class Terminal2TrackControl:  # 0:normal, 1:crossing, 2:stn
     def __init__(
-        self, sections: list[SectionLike], timetable: list[dict[str, int]]
+        self, sections: list[SectionLike], timetable: Sequence[dict[str, int]]
     ) -> None:
         self.sections: list[SectionLike] = [sections[i] for i in range(9, 12)]
-        self.timetable: list[dict[str, int]] = timetable
+        self.timetable: Sequence[dict[str, int]] = timetable
         self.progress: int = 0
         self.arr_track: int = 0
 
@@ -152,6 +166,20 @@ class Terminal2TrackControl:  # 0:normal, 1:crossing, 2:stn
             self._cleared_to_arr()
         self.progress += 1
 
+    # 次の update で状態を変える処理があるか
+    def has_pending_work(self) -> bool:
+        for i in (0, 1):
+            unit = self.sections[1].units[i]
+            if unit.situation is UnitSituation.OCCUPIED and unit.down_sign != Sign.RED:
+                return True
+        for i in (2, 3):
+            unit = self.sections[1].units[i]
+            if unit.situation is UnitSituation.OCCUPIED and unit.up_sign != Sign.RED:
+                return True
+        if self.progress > len(self.timetable) - 1:
+            return False
+        return self._check_pass_allowed()
+
     def _cleared_for_dep(self) -> None:
         schedule = self.timetable[self.progress]
         if schedule["track"] == 0:
@@ -0,0 +1,170 @@
+import numpy as np
+from typing import cast
+from .enums import Sign, TrainSituation, Direction, UnitSituation
+from .graph import SIGN_CODES
+from .module import Line, Train, MiddleUnitBase
+from .scheduler import WakeupQueue
+
+
+# 全 Train の走行状態を配列で持ち、走行中の Train をまとめて更新するエンジン
+# 発車判定 (ダイヤの参照) だけは Train オブジェクトのロジックをそのまま使う
+class TrainFleet:
+    GREEN: int = SIGN_CODES[Sign.GREEN]
+    YELLOW: int = SIGN_CODES[Sign.YELLOW]
+    ACCELERATE_TIME: int = 30
+
+    def __init__(self, line: Line, trains: list[Train]) -> None:
+        self.line: Line = line
+        self.trains: list[Train] = trains
+        self.half_length: np.ndarray = line.graph.rail_length.astype(np.int64) // 2
+
+        self.uid: np.ndarray = np.array(
+            [train.curr_unit.uid for train in trains], dtype=np.int64
+        )
+        self.past_uid: np.ndarray = np.array(
+            [train.past_unit.uid for train in trains], dtype=np.int64
+        )
+        self.target_uid: np.ndarray = np.array(
+            [
+                train.target_unit.uid if hasattr(train, "target_unit") else -1
+                for train in trains
+            ],
+            dtype=np.int64,
+        )
+        self.index: np.ndarray = np.array(
+            [train.curr_index for train in trains], dtype=np.int64
+        )
+        self.speed: np.ndarray = np.array(
+            [train.curr_speed for train in trains], dtype=np.int64
+        )
+        self.speed_limit: np.ndarray = np.array(
+            [train.speed_limit for train in trains], dtype=np.int64
+        )
+        self.max_speed: np.ndarray = np.array(
+            [train.max_speed for train in trains], dtype=np.int64
+        )
+        self.process_time: np.ndarray = np.array(
+            [train.process_time for train in trains], dtype=np.int64
+        )
+        self.direction: np.ndarray = np.array(
+            [train.direction.value for train in trains], dtype=np.int64
+        )
+        self.moving: np.ndarray = np.array(
+            [train.situation is TrainSituation.MOVING for train in trains], dtype=bool
+        )
+        # 停車中の Train は発車時刻まで起床待ち行列に入れておく
+        self.wakeups: WakeupQueue = WakeupQueue()
+        for i in range(len(trains)):
+            if not self.moving[i]:
+                self._park(i)
+
+    def __len__(self) -> int:
+        return len(self.trains)
+
+    def update(self, curr_minutes: int) -> None:
+        moving = np.flatnonzero(self.moving)
+        for i in self.wakeups.pop_due(curr_minutes):
+            self._departure(i, curr_minutes)
+        if moving.size:
+            self._move(moving)
+        units = self.line.graph.units
+        for i in np.flatnonzero(self.uid != self.past_uid):
+            units[self.past_uid[i]].situation = UnitSituation.FREE
+            units[self.uid[i]].situation = UnitSituation.OCCUPIED
+            self.past_uid[i] = self.uid[i]
+
+    # 配列の状態を Train オブジェクトに書き戻す (描画・表示用)
+    def sync_trains(self) -> None:
+        units = self.line.graph.units
+        for i, train in enumerate(self.trains):
+            train.curr_unit = units[self.uid[i]]
+            train.past_unit = units[self.past_uid[i]]
+            if self.target_uid[i] >= 0:
+                train.target_unit = units[self.target_uid[i]]
+            train.curr_index = int(self.index[i])
+            train.curr_speed = int(self.speed[i])
+            train.speed_limit = int(self.speed_limit[i])
+            train.process_time = int(self.process_time[i])
+            train.direction = Direction(int(self.direction[i]))
+            train.situation = (
+                TrainSituation.MOVING if self.moving[i] else TrainSituation.WAITTING
+            )
+
+    def _departure(self, i: int, curr_minutes: int) -> None:
+        train = self.trains[i]
+        if train._departure(curr_minutes, self.line):
+            self.moving[i] = True
+            self.direction[i] = train.direction.value
+            self.target_uid[i] = train.target_unit.uid
+        else:
+            self._park(i)
+
+    def _move(self, idx: np.ndarray) -> None:
+        graph = self.line.graph
+        uid = self.uid[idx]
+        index = self.index[idx]
+        speed = self.speed[idx]
+        speed_limit = self.speed_limit[idx]
+        process_time = self.process_time[idx]
+        direction = self.direction[idx]
+        target = self.target_uid[idx]
+
+        # 進行方向の次の Unit の信号
+        forward = direction == Direction.FORWARD.value
+        sign = np.where(
+            forward,
+            graph.down_sign[graph.next_of_many(uid)],
+            graph.up_sign[graph.prev_of_many(uid)],
+        )
+        green = sign == self.GREEN
+        yellow = sign == self.YELLOW
+        speed_limit = np.where(green, self.max_speed[idx], speed_limit)
+        speed_limit = np.where(yellow, 1, speed_limit)
+        red = ~green & ~yellow
+        overrun = red & ((self.half_length[uid] - index) * direction < 0)
+        speed = np.where(overrun, 0, speed)
+
+        # 加速 (目的の Unit に到達するまで)
+        accelerate = uid != target
+        waiting = accelerate & (process_time > 0)
+        speed_up = accelerate & ~waiting & (speed < speed_limit)
+        process_time = np.where(waiting, process_time - 1, process_time)
+        speed = np.where(speed_up, speed + 1, speed)
+        process_time = np.where(speed_up, self.ACCELERATE_TIME, process_time)
+
+        # 減速・停車 (目的の Unit の中央で止まる)
+        decelerate = ~accelerate
+        stop_index = self.half_length[target]
+        remain_dist = np.abs(stop_index - index)
+        dece_dist = speed * (speed - 1) * 10
+        arrive = decelerate & (remain_dist <= speed)
+        slow_down = decelerate & ~arrive & (remain_dist <= dece_dist) & (speed > 1)
+        index = np.where(arrive, stop_index, index)
+        speed = np.where(arrive, 0, speed)
+        direction = np.where(arrive, Direction.NEUTRAL.value, direction)
+        speed = np.where(slow_down, speed - 1, speed)
+
+        index = index + speed * direction
+        self.speed[idx] = speed
+        self.speed_limit[idx] = speed_limit
+        self.process_time[idx] = process_time
+        self.direction[idx] = direction
+
+        # Unit の外に出た Train だけ、次の Unit を解決する
+        outside = (index < 0) | (index > graph.rail_length[uid] - 1)
+        for k in np.flatnonzero(outside):
+            unit = cast(MiddleUnitBase, graph.units[uid[k]])
+            (next_unit, next_index) = self.line.get_next_pos(unit, int(index[k]))
+            uid[k] = next_unit.uid
+            index[k] = next_index
+        self.uid[idx] = uid
+        self.index[idx] = index
+
+        for i in idx[arrive].tolist():
+            self.moving[i] = False
+            self._park(i)
+
+    def _park(self, i: int) -> None:
+        dep_time = self.trains[i].next_dep_time
+        if dep_time is not None:
+            self.wakeups.push(dep_time, i)
@@ -0,0 +1,136 @@
+import numpy as np
+from typing import Any, Callable
+from .enums import Sign
+from .type_hint import UnitLike, SectionLike
+
+
+SwitchListener = Callable[[int, bool], None]
+UnitListener = Callable[[int], None]
+
+# 信号の現示を配列に格納するときのコード
+SIGNS: tuple[Sign, ...] = tuple(Sign)
+SIGN_CODES: dict[Sign, int] = {sign: code for (code, sign) in enumerate(SIGNS)}
+
+
+# Line のトポロジーを整数 id の平坦な配列に変換したもの
+# prev/next は CSR 形式: uid の候補は targets[offsets[uid]:offsets[uid + 1]]
+class LineGraph:
+    def __init__(self, sections: list[SectionLike]) -> None:
+        self.units: list[UnitLike] = self._collect_units(sections)
+        count = len(self.units)
+        self.section_index: np.ndarray = np.full(count, -1, dtype=np.int32)
+        self.unit_index: np.ndarray = np.full(count, -1, dtype=np.int32)
+        for i, section in enumerate(sections):
+            for j, unit in enumerate(section.units):
+                self.section_index[unit.uid] = i
+                self.unit_index[unit.uid] = j
+
+        (self.prev_offsets, self.prev_targets) = self._compile_csr(
+            [unit.prev_units for unit in self.units]
+        )
+        (self.next_offsets, self.next_targets) = self._compile_csr(
+            [unit.next_units for unit in self.units]
+        )
+        self.rail_length: np.ndarray = np.array(
+            [len(unit.rail) for unit in self.units], dtype=np.int32
+        )
+        self.prev_switch: np.ndarray = np.array(
+            [unit.prev_index for unit in self.units], dtype=np.int32
+        )
+        self.next_switch: np.ndarray = np.array(
+            [unit.next_index for unit in self.units], dtype=np.int32
+        )
+        self.up_sign: np.ndarray = np.array(
+            [SIGN_CODES[unit.up_sign] for unit in self.units], dtype=np.int8
+        )
+        self.down_sign: np.ndarray = np.array(
+            [SIGN_CODES[unit.down_sign] for unit in self.units], dtype=np.int8
+        )
+        self.switch_listeners: list[SwitchListener] = []
+        self.unit_listeners: list[UnitListener] = []
+        for unit in self.units:
+            unit.graph = self
+
+    def __len__(self) -> int:
+        return len(self.units)
+
+    def __getstate__(self) -> dict[str, Any]:
+        state = self.__dict__.copy()
+        state.update(switch_listeners=[], unit_listeners=[])
+        return state
+
+    # pickle から戻すときは、Unit 同士の参照を CSR 配列から張り直す
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        for uid, unit in enumerate(self.units):
+            unit.graph = self
+            unit.prev_units = [self.units[i] for i in self.prev_candidates(uid)]
+            unit.next_units = [self.units[i] for i in self.next_candidates(uid)]
+
+    def prev_of(self, uid: int) -> int:
+        start = self.prev_offsets[uid]
+        if start == self.prev_offsets[uid + 1]:
+            return -1
+        return int(self.prev_targets[start + self.prev_switch[uid]])
+
+    def next_of(self, uid: int) -> int:
+        start = self.next_offsets[uid]
+        if start == self.next_offsets[uid + 1]:
+            return -1
+        return int(self.next_targets[start + self.next_switch[uid]])
+
+    # prev_of / next_of の配列版 (全ての uid が候補を持つこと)
+    def prev_of_many(self, uids: np.ndarray) -> np.ndarray:
+        return self.prev_targets[self.prev_offsets[uids] + self.prev_switch[uids]]
+
+    def next_of_many(self, uids: np.ndarray) -> np.ndarray:
+        return self.next_targets[self.next_offsets[uids] + self.next_switch[uids]]
+
+    def prev_candidates(self, uid: int) -> np.ndarray:
+        return self.prev_targets[self.prev_offsets[uid] : self.prev_offsets[uid + 1]]
+
+    def next_candidates(self, uid: int) -> np.ndarray:
+        return self.next_targets[self.next_offsets[uid] : self.next_offsets[uid + 1]]
+
+    def locate(self, uid: int) -> tuple[int, int]:
+        return (int(self.section_index[uid]), int(self.unit_index[uid]))
+
+    # Unit の prev_index / next_index が変更されたときに呼ばれる
+    def on_switch(self, uid: int, position: int, is_next: bool) -> None:
+        if is_next:
+            self.next_switch[uid] = position
+        else:
+            self.prev_switch[uid] = position
+        for listener in self.switch_listeners:
+            listener(uid, is_next)
+
+    # Unit の situation / is_controlled が変更されたときに呼ばれる
+    def on_unit_change(self, uid: int) -> None:
+        for listener in self.unit_listeners:
+            listener(uid)
+
+    # Section に属さない Unit (分岐先の仮の EndUnit など) も辿って id を振る
+    @staticmethod
+    def _collect_units(sections: list[SectionLike]) -> list[UnitLike]:
+        units = [unit for section in sections for unit in section.units]
+        for uid, unit in enumerate(units):
+            unit.uid = uid
+        i = 0
+        while i < len(units):
+            for unit in (*units[i].prev_units, *units[i].next_units):
+                if unit.uid < 0:
+                    unit.uid = len(units)
+                    units.append(unit)
+            i += 1
+        return units
+
+    @staticmethod
+    def _compile_csr(
+        neighbours: list[list[UnitLike]],
+    ) -> tuple[np.ndarray, np.ndarray]:
+        offsets = np.zeros(len(neighbours) + 1, dtype=np.int32)
+        offsets[1:] = np.cumsum([len(units) for units in neighbours])
+        targets = np.array(
+            [unit.uid for units in neighbours for unit in units], dtype=np.int32
+        )
+        return (offsets, targets)
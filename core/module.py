@@ -1,5 +1,10 @@
-import math
-from typing import cast
+import numpy as np
+from functools import lru_cache
+from typing import Any, Optional, Sequence, cast
+from .rail import StraightRail, ArrayRail
+from .graph import LineGraph, SIGN_CODES
+from .route import RouteIndex
+from .signal import SignalEngine
 from .enums import Sign, TrainSituation, Direction, UnitSituation
 from .type_hint import (
     Coord,
@@ -16,101 +21,200 @@ from .type_hint import (
 )
 
 
+# 全Unitクラスの親クラス
+# prev_index / next_index (分岐器の向き)、situation、is_controlled、信号の変更は
+# LineGraph に通知される
+class UnitBase:
+    __slots__ = (
+        "uid",
+        "graph",
+        "prev_units",
+        "_prev_index",
+        "next_units",
+        "_next_index",
+        "rail",
+        "_situation",
+        "_is_controlled",
+        "_up_sign",
+        "_down_sign",
+    )
+
+    def __init__(
+        self, prev_units: list[UnitLike], situation: UnitSituation, sign: Sign
+    ) -> None:
+        self.uid: int = -1
+        self.graph: Optional[LineGraph] = None
+        self.prev_units: list[UnitLike] = prev_units
+        self._prev_index: int = 0
+        self.next_units: list[UnitLike] = []
+        self._next_index: int = 0
+        self.rail: Rail = StraightRail(0, 0, 0)
+
+        self._situation: UnitSituation = situation
+        self._is_controlled: bool = False
+        self._up_sign: Sign = sign
+        self._down_sign: Sign = sign
+
+    # 隣接 Unit への参照は保存せず、LineGraph の CSR 配列から復元する (深い再帰を避ける)
+    def __getstate__(self) -> dict[str, Any]:
+        state = {name: getattr(self, name) for name in UnitBase.__slots__}
+        state.update(graph=None, prev_units=[], next_units=[])
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
+    @property
+    def prev_index(self) -> int:
+        return self._prev_index
+
+    @prev_index.setter
+    def prev_index(self, value: int) -> None:
+        if value == self._prev_index:
+            return
+        self._prev_index = value
+        if self.graph is not None:
+            self.graph.on_switch(self.uid, value, False)
+
+    @property
+    def next_index(self) -> int:
+        return self._next_index
+
+    @next_index.setter
+    def next_index(self, value: int) -> None:
+        if value == self._next_index:
+            return
+        self._next_index = value
+        if self.graph is not None:
+            self.graph.on_switch(self.uid, value, True)
+
+    @property
+    def situation(self) -> UnitSituation:
+        return self._situation
+
+    @situation.setter
+    def situation(self, value: UnitSituation) -> None:
+        if value is self._situation:
+            return
+        self._situation = value
+        if self.graph is not None:
+            self.graph.on_unit_change(self.uid)
+
+    @property
+    def is_controlled(self) -> bool:
+        return self._is_controlled
+
+    @is_controlled.setter
+    def is_controlled(self, value: bool) -> None:
+        if value == self._is_controlled:
+            return
+        self._is_controlled = value
+        if self.graph is not None:
+            self.graph.on_unit_change(self.uid)
+
+    @property
+    def up_sign(self) -> Sign:
+        return self._up_sign
+
+    @up_sign.setter
+    def up_sign(self, value: Sign) -> None:
+        self._up_sign = value
+        if self.graph is not None:
+            self.graph.up_sign[self.uid] = SIGN_CODES[value]
+
+    @property
+    def down_sign(self) -> Sign:
+        return self._down_sign
+
+    @down_sign.setter
+    def down_sign(self, value: Sign) -> None:
+        self._down_sign = value
+        if self.graph is not None:
+            self.graph.down_sign[self.uid] = SIGN_CODES[value]
+
+
 # MiddleUnitクラスの ABC and 親クラス
 # attitude: rail, prev_unit-rerated, next_unit-rerated, signal-rerated
 # methods: set_next_units, select_unit (prev and next)
-class MiddleUnitBase:
+class MiddleUnitBase(UnitBase):
+    __slots__ = ()
+
     def __init__(self, prev_units: list[UnitLike]) -> None:
-        self.prev_units: list[UnitLike] = prev_units
-        self.prev_index: int = 0
-        self.next_units: list[UnitLike] = []
-        self.next_index: int = 0
-        self.rail: Rail = []
+        super().__init__(prev_units, UnitSituation.FREE, Sign.GREEN)
 
-        self.situation: UnitSituation = UnitSituation.FREE
-        self.is_controlled: bool = False
-        self.up_sign: Sign = Sign.GREEN
-        self.down_sign: Sign = Sign.GREEN
 
+class StartUnit(UnitBase):
+    __slots__ = ()
 
-class StartUnit:
     def __init__(self, start_coord: Coord) -> None:
-        self.rail: Rail = [start_coord]
-        self.prev_units: list[UnitLike] = []
-        self.prev_index: int = 0
-        self.next_units: list[UnitLike] = [EndUnit([self])]
-        self.next_index: int = 0
+        super().__init__([], UnitSituation.DEAD_END, Sign.RED)
+        self.rail = StraightRail(start_coord[0], start_coord[1], 1)
+        self.next_units = [EndUnit([self])]
 
-        self.situation: UnitSituation = UnitSituation.DEAD_END
-        self.is_controlled: bool = False
-        self.up_sign: Sign = Sign.RED
-        self.down_sign: Sign = Sign.RED
 
+class EndUnit(UnitBase):
+    __slots__ = ()
 
-class EndUnit:
     def __init__(self, prev_units: list[UnitLike]) -> None:
-        self.prev_units: list[UnitLike] = prev_units
-        self.prev_index: int = 0
-        self.next_units: list[UnitLike] = []
-        self.next_index: int = 0
-        self.rail: Rail = [self.prev_units[self.prev_index].rail[-1]]
-
-        self.situation: UnitSituation = UnitSituation.DEAD_END
-        self.is_controlled: bool = False
-        self.up_sign: Sign = Sign.RED
-        self.down_sign: Sign = Sign.RED
+        super().__init__(prev_units, UnitSituation.DEAD_END, Sign.RED)
+        (x0, y0) = self.prev_units[self.prev_index].rail[-1]
+        self.rail = StraightRail(x0, y0, 1)
 
 
 class StraightUnit(MiddleUnitBase):
+    __slots__ = ()
+
     def __init__(self, prev_units: list[UnitLike], length: float) -> None:
         super().__init__(prev_units)
         x0, y0 = self.prev_units[self.prev_index].rail[-1]
-        self.rail = [(x0 + i, y0) for i in range(int(length))]
+        self.rail = StraightRail(x0, y0, int(length))
         self.next_units: list[UnitLike] = [EndUnit([self])]
 
 
 class CurveUnit(MiddleUnitBase):
+    __slots__ = ()
+
     def __init__(self, prev_units: list[UnitLike], vector: Coord) -> None:
         super().__init__(prev_units)
         self.rail = self._create_rail(vector)
         self.next_units: list[UnitLike] = [EndUnit([self])]
 
     def _create_rail(self, vector: Coord) -> Rail:
-        start_coord = self.prev_units[self.prev_index].rail[-1]
-        length = self._calc_length(vector)
-        rail = []
-        config = [
-            start_coord,
-            (start_coord[0] + vector[0] / 2, start_coord[1]),
-            (start_coord[0] + vector[0] / 2, start_coord[1] + vector[1]),
-            (start_coord[0] + vector[0], start_coord[1] + vector[1]),
-        ]
-        for i in range(1, int(length) + 1):
-            t = i / length
-            point = self._cubic_bezier(t, config)
-            rail.append(point)
-        return rail
+        (x0, y0) = self.prev_units[self.prev_index].rail[-1]
+        return ArrayRail(self._arc_points((vector[0], vector[1])) + (x0, y0))
 
-    def _calc_length(self, vector: Coord, resolution: int = 1000) -> float:
+    # 形状は vector だけで決まるので、相対座標の点列をカーブの種類ごとに共有する
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _arc_points(vector: Coord, resolution: int = 1000) -> np.ndarray:
         config = [
             (0, 0),
             (vector[0] / 2, 0),
             (vector[0] / 2, vector[1]),
             (vector[0], vector[1]),
         ]
-        prev_point = config[0]
-        total_length = 0.0
-        for i in range(1, resolution + 1):
-            t = i / resolution
-            point = self._cubic_bezier(t, config)
-            total_length += math.hypot(
-                prev_point[0] - point[0], prev_point[1] - point[1]
-            )
-            prev_point = point
-        return total_length
+        # 弧長テーブル: t のサンプル点ごとの累積長
+        t_table = np.linspace(0.0, 1.0, resolution + 1)
+        (xs, ys) = CurveUnit._cubic_bezier(t_table, config)
+        arc_table = np.concatenate(
+            ([0.0], np.cumsum(np.hypot(np.diff(xs), np.diff(ys))))
+        )
+        length = float(arc_table[-1])
+        count = int(length)
+        if count == 0:
+            return np.empty((0, 2))
+        # 弧長で等間隔になる t を逆引きする
+        arc = np.arange(1, count + 1) * (length / count)
+        t = np.interp(arc, arc_table, t_table)
+        points = np.column_stack(CurveUnit._cubic_bezier(t, config))
+        points.setflags(write=False)
+        return points
 
     @staticmethod
-    def _cubic_bezier(t: float, config: list[Coord]) -> Coord:
+    def _cubic_bezier(
+        t: np.ndarray, config: list[Coord]
+    ) -> tuple[np.ndarray, np.ndarray]:
         u = 1 - t
         x = (
             u**3 * config[0][0]
@@ -239,23 +343,34 @@ class Line:
         self.stations: dict[str, list[MiddleUnitBase]] = self._create_stations(
             line_file["stations"]
         )
+        self.graph: LineGraph = LineGraph(self.sections)
+        self.route_index: RouteIndex = RouteIndex(self.graph)
+        self.signal_engine: SignalEngine = SignalEngine(self.graph, len(self.sections))
+
+    # 索引・信号エンジンは保存せず、読み込み時に作り直す
+    def __getstate__(self) -> dict[str, Any]:
+        return {
+            "sections": self.sections,
+            "stations": self.stations,
+            "graph": self.graph,
+        }
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.sections = state["sections"]
+        self.stations = state["stations"]
+        self.graph = state["graph"]
+        self.route_index = RouteIndex(self.graph)
+        self.signal_engine = SignalEngine(self.graph, len(self.sections))
 
-    @staticmethod
     def get_next_pos(
-        curr_unit: MiddleUnitBase, curr_index: int
+        self, curr_unit: MiddleUnitBase, curr_index: int
     ) -> tuple[MiddleUnitBase, int]:
         if curr_index < 0:
-            next_unit = curr_unit.prev_units[curr_unit.prev_index]
-            next_index = curr_index + (len(next_unit.rail) - 1)
-            while next_index < 0:
-                next_unit = next_unit.prev_units[next_unit.prev_index]
-                next_index = next_index + (len(next_unit.rail) - 1)
+            (uid, next_index) = self.route_index.backward(curr_unit.uid, curr_index)
+            next_unit = self.graph.units[uid]
         elif curr_index > (len(curr_unit.rail) - 1):
-            next_index = curr_index - (len(curr_unit.rail) - 1)
-            next_unit = curr_unit.next_units[curr_unit.next_index]
-            while next_index > (len(next_unit.rail) - 1):
-                next_index = next_index - (len(next_unit.rail) - 1)
-                next_unit = next_unit.next_units[next_unit.next_index]
+            (uid, next_index) = self.route_index.forward(curr_unit.uid, curr_index)
+            next_unit = self.graph.units[uid]
         else:
             (next_unit, next_index) = (curr_unit, curr_index)
         if not isinstance(next_unit, MiddleUnitBase):
@@ -263,27 +378,9 @@ class Line:
         _next_unit = cast(MiddleUnitBase, next_unit)
         return (_next_unit, next_index)
 
+    # 前回から変化のあった Unit とその隣接 Unit の信号だけを再計算する
     def update_sign(self) -> None:
-        for i in range(1, len(self.sections) - 1):
-            for unit in self.sections[i].units:
-                if unit.is_controlled:
-                    pass
-                elif unit.situation is UnitSituation.OCCUPIED:
-                    unit.up_sign = Sign.RED
-                    unit.down_sign = Sign.RED
-                else:
-                    unit.up_sign = Sign.GREEN
-                    unit.down_sign = Sign.GREEN
-                    if (
-                        unit.next_units[unit.next_index].situation
-                        is UnitSituation.OCCUPIED
-                    ):
-                        unit.down_sign = Sign.YELLOW
-                    if (
-                        unit.prev_units[unit.prev_index].situation
-                        is UnitSituation.OCCUPIED
-                    ):
-                        unit.up_sign = Sign.YELLOW
+        self.signal_engine.update()
 
     @staticmethod
     def _create_sections(section_data: list[SectionItem]) -> list[SectionLike]:
@@ -322,20 +419,28 @@ class Line:
         return stations
 
 
+# ダイヤの始発の発車時刻 (運用の並び順に使う)
+def first_departure(entry: TimetableEntry) -> int:
+    return entry["schedule"][0].get("dep_time") or 0
+
+
 class Train:
     def __init__(
         self,
         stations: dict[str, list[MiddleUnitBase]],
         train: TrainDef,
-        schedule: TimetableEntry,
+        roster: Sequence[TimetableEntry],
     ) -> None:
         self.train_id: str = train["id"]
         self.max_speed: int = train["max_speed"]
         self.speed_limit: int = self.max_speed
         self.color: Color = train["color"]
 
-        self.number: int = schedule["number"]
-        self.schedule: list[ScheduleItem] = schedule["schedule"]
+        # 1 日の運用 (始発の発車時刻順)。終わったダイヤの次のダイヤに乗り継ぐ
+        self.roster: Sequence[TimetableEntry] = roster
+        self.roster_index: int = 0
+        self.number: int = roster[0]["number"]
+        self.schedule: list[ScheduleItem] = roster[0]["schedule"]
         self.progress: int = 0
 
         self.curr_unit: MiddleUnitBase = stations[train["init_stn"]][
@@ -348,6 +453,18 @@ class Train:
         self.situation: TrainSituation = TrainSituation.WAITTING
         self.past_unit: MiddleUnitBase = self.curr_unit
 
+    # 次に発車する時刻 (運用が終わっていれば None)
+    @property
+    def next_dep_time(self) -> Optional[int]:
+        if self.progress < len(self.schedule) - 1:
+            stop = self.schedule[self.progress]
+        elif self.roster_index < len(self.roster) - 1:
+            stop = self.roster[self.roster_index + 1]["schedule"][0]
+        else:
+            return None
+        # dep_time が未定義なら、すぐに _departure を呼んでエラーにする
+        return stop["dep_time"] or 0
+
     def update(self, curr_minutes: int, line: Line) -> None:
         if self.situation == TrainSituation.WAITTING:
             self._departure(curr_minutes, line)
@@ -359,13 +476,17 @@ class Train:
             self.curr_unit.situation = UnitSituation.OCCUPIED
             self.past_unit = self.curr_unit
 
-    def _departure(self, curr_minutes: int, line: Line) -> None:
-        if self.progress >= len(self.schedule) - 1:
-            return
-        if not self.schedule[self.progress]["dep_time"]:
+    # 発車したら True
+    def _departure(self, curr_minutes: int, line: Line) -> bool:
+        dep_time = self.next_dep_time
+        if dep_time is None:
+            return False
+        if not dep_time:
             raise RuntimeError("dep_time is not defined.")
-        if curr_minutes < cast(int, self.schedule[self.progress]["dep_time"]):
-            return
+        if curr_minutes < dep_time:
+            return False
+        if self.progress >= len(self.schedule) - 1:
+            self._next_entry()
         if self.schedule[self.progress]["direction"] == Direction.FORWARD.name:
             self.direction = Direction.FORWARD
         elif self.schedule[self.progress]["direction"] == Direction.BACKWARD.name:
@@ -375,6 +496,14 @@ class Train:
         target_track = self.schedule[self.progress]["track"]
         self.target_unit = line.stations[target_stn][target_track]
         self.situation = TrainSituation.MOVING
+        return True
+
+    def _next_entry(self) -> None:
+        self.roster_index += 1
+        entry = self.roster[self.roster_index]
+        self.number = entry["number"]
+        self.schedule = entry["schedule"]
+        self.progress = 0
 
     def _move(self, line: Line) -> None:  # signal add
         if self.direction == Direction.FORWARD:
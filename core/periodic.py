@@ -0,0 +1,142 @@
+import heapq
+from collections import deque
+from collections.abc import Sequence
+from typing import Iterable, Iterator, TypeVar
+from .module import first_departure
+from .type_hint import PatternDef, TimetableEntry
+
+T = TypeVar("T")
+
+
+# 長さの分かっている、先頭から順に読む遅延列
+# 読んだ位置の 1 つ前より古い要素は捨てるので、メモリは全体の長さによらない
+class LazySequence(Sequence[T]):
+    def __init__(self, items: Iterator[T], length: int) -> None:
+        self._items: Iterator[T] = items
+        self._length: int = length
+        self._window: deque[T] = deque()
+        self._start: int = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index: int) -> T:  # type: ignore[override]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("LazySequence index out of range")
+        if index < self._start:
+            raise IndexError("LazySequence item already released")
+        while self._start + len(self._window) <= index:
+            self._window.append(next(self._items))
+        while self._start < index - 1:
+            self._window.popleft()
+            self._start += 1
+        return self._window[index - self._start]
+
+
+def run_count(pattern: PatternDef) -> int:
+    return (pattern["end"] - pattern["start"]) // pattern["interval"] + 1
+
+
+def last_number(pattern: PatternDef) -> int:
+    return pattern["first_number"] + pattern.get("number_step", 2) * (
+        run_count(pattern) - 1
+    )
+
+
+# パターンの k 本目の列車 (時刻はパターンの時刻を発車時刻だけずらしたもの)
+def expand_run(pattern: PatternDef, k: int) -> TimetableEntry:
+    offset = pattern["start"] + pattern["interval"] * k
+    trains = pattern["trains"]
+    schedule = []
+    for stop in pattern["schedule"]:
+        item = dict(stop)
+        for key in ("arr_time", "dep_time"):
+            if item.get(key) is not None:
+                item[key] += offset
+        schedule.append(item)
+    return {
+        "train_id": trains[k % len(trains)],
+        "number": pattern["first_number"] + pattern.get("number_step", 2) * k,
+        "schedule": schedule,  # type: ignore[typeddict-item]
+    }
+
+
+# パターンの中で train_id が受け持つ列車の番号 (k、昇順) とその本数
+def runs_of(pattern: PatternDef, train_id: str) -> tuple[Iterator[int], int]:
+    trains = pattern["trains"]
+    runs = [
+        range(j, run_count(pattern), len(trains))
+        for (j, t) in enumerate(trains)
+        if t == train_id
+    ]
+    return (heapq.merge(*runs), sum(map(len, runs)))
+
+
+def expand_runs(pattern: PatternDef, runs: Iterable[int]) -> Iterator[TimetableEntry]:
+    for k in runs:
+        yield expand_run(pattern, k)
+
+
+# 等間隔 (クロックフェース) のダイヤ
+# 列車はシミュレーションが近づいたときに 1 本ずつ作るので、
+# メモリと読み込み時間はパターン数に比例する
+class PeriodicTimetable:
+    def __init__(self, patterns: list[PatternDef]) -> None:
+        self.patterns: list[PatternDef] = patterns
+
+    # train_id の運用 (明示したダイヤとパターンの列車を始発の発車時刻順に並べたもの)
+    def roster(
+        self, train_id: str, entries: list[TimetableEntry]
+    ) -> LazySequence[TimetableEntry]:
+        sources = [iter(sorted(entries, key=first_departure))]
+        length = len(entries)
+        for pattern in self.patterns:
+            (runs, count) = runs_of(pattern, train_id)
+            sources.append(expand_runs(pattern, runs))
+            length += count
+        return LazySequence(heapq.merge(*sources, key=first_departure), length)
+
+    # 進路設定リスト (明示したものとパターンの列車の分を時刻順に並べたもの)
+    # 番号の偶奇が dep_parity に等しい列車はここから発車し、それ以外はここに到着する
+    def route_orders(
+        self,
+        orders: list[dict[str, int]],
+        entries: dict[int, TimetableEntry],
+        dep_parity: int,
+    ) -> LazySequence[dict[str, int]]:
+        def keyed(
+            items: Iterator[TimetableEntry],
+        ) -> Iterator[tuple[int, dict[str, int]]]:
+            for entry in items:
+                yield (
+                    self._order_time(entry, dep_parity),
+                    self._order(entry, dep_parity),
+                )
+
+        sources = [
+            (
+                (self._order_time(entries[order["number"]], dep_parity), order)
+                for order in orders
+            )
+        ]
+        length = len(orders)
+        for pattern in self.patterns:
+            sources.append(keyed(expand_runs(pattern, range(run_count(pattern)))))
+            length += run_count(pattern)
+        merged = heapq.merge(*sources, key=lambda item: item[0])
+        return LazySequence((order for (_, order) in merged), length)
+
+    @staticmethod
+    def _order(entry: TimetableEntry, dep_parity: int) -> dict[str, int]:
+        schedule = entry["schedule"]
+        stop = schedule[0] if entry["number"] % 2 == dep_parity else schedule[-1]
+        return {"number": entry["number"], "track": stop["track"]}
+
+    @staticmethod
+    def _order_time(entry: TimetableEntry, dep_parity: int) -> int:
+        schedule = entry["schedule"]
+        if entry["number"] % 2 == dep_parity:
+            return schedule[0]["dep_time"] or 0
+        return schedule[-1]["arr_time"] or 0
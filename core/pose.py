@@ -0,0 +1,73 @@
+import numpy as np
+from typing import Iterable, Optional
+from .module import Line, MiddleUnitBase
+
+# 全車両の (x, y, 向き)
+Poses = tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+# 各列車の車両ごとの位置 (x, y) と向き (度) を 1 tick に 1 回だけ計算して持つ
+# 描画側は直前の tick との間を補間して読むだけで、路線をたどらない
+class PoseBuffer:
+    def __init__(self, line: Line, n_trains: int, car_offsets: tuple[int, ...]) -> None:
+        self.line: Line = line
+        # 先頭からの各車両の位置 (レールの添字のずれ)
+        self.car_offsets: tuple[int, ...] = car_offsets
+        shape = (n_trains, len(car_offsets))
+        self.x: np.ndarray = np.zeros(shape, dtype=np.float32)
+        self.y: np.ndarray = np.zeros(shape, dtype=np.float32)
+        self.angle: np.ndarray = np.zeros(shape, dtype=np.float32)
+        self.prev_x: np.ndarray = np.zeros(shape, dtype=np.float32)
+        self.prev_y: np.ndarray = np.zeros(shape, dtype=np.float32)
+        self.prev_angle: np.ndarray = np.zeros(shape, dtype=np.float32)
+        # 前回計算したときの (uid, index)。動いていない列車は計算し直さない
+        self._keys: list[Optional[tuple[int, int]]] = [None] * n_trains
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def capture(self, positions: Iterable[tuple[MiddleUnitBase, int]]) -> None:
+        np.copyto(self.prev_x, self.x)
+        np.copyto(self.prev_y, self.y)
+        np.copyto(self.prev_angle, self.angle)
+        for i, (unit, index) in enumerate(positions):
+            key = (unit.uid, index)
+            if key == self._keys[i]:
+                continue
+            first = self._keys[i] is None
+            self._keys[i] = key
+            for c, offset in enumerate(self.car_offsets):
+                (car_unit, car_index) = self.line.get_next_pos(unit, index + offset)
+                (self.x[i, c], self.y[i, c]) = car_unit.rail[car_index]
+                self.angle[i, c] = car_unit.rail.heading(car_index)
+            if first:
+                self.prev_x[i] = self.x[i]
+                self.prev_y[i] = self.y[i]
+                self.prev_angle[i] = self.angle[i]
+
+    # 直前の tick の姿勢
+    @property
+    def previous(self) -> Poses:
+        return (self.prev_x, self.prev_y, self.prev_angle)
+
+    # 最新の tick の姿勢
+    @property
+    def current(self) -> Poses:
+        return (self.x, self.y, self.angle)
+
+    # alpha = 0 で前の tick、1 で最新の tick の姿勢
+    def lerp(self, alpha: float) -> Poses:
+        return lerp_poses(self.previous, self.current, alpha)
+
+
+# (x, y, 向き) の 2 つの姿勢の間を補間する
+def lerp_poses(prev: Poses, curr: Poses, alpha: float) -> Poses:
+    if alpha >= 1:
+        return curr
+    (prev_x, prev_y, prev_angle) = prev
+    (x, y, angle) = curr
+    x = prev_x + (x - prev_x) * alpha
+    y = prev_y + (y - prev_y) * alpha
+    # 向きは近い回り方で補間する
+    turn = (angle - prev_angle + 180) % 360 - 180
+    return (x, y, prev_angle + turn * alpha)
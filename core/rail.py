@@ -0,0 +1,62 @@
+import numpy as np
+from typing import Iterator
+from .type_hint import Coord
+
+
+# 直線レール: 始点と長さだけを持ち、座標は参照時に計算する
+class StraightRail:
+    __slots__ = ("x0", "y0", "length")
+
+    def __init__(self, x0: float, y0: float, length: int) -> None:
+        self.x0: float = x0
+        self.y0: float = y0
+        self.length: int = length
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, index: int) -> Coord:
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("rail index out of range")
+        return (self.x0 + index, self.y0)
+
+    def __iter__(self) -> Iterator[Coord]:
+        for i in range(self.length):
+            yield (self.x0 + i, self.y0)
+
+    # 添字が増える向きの進行方向 (度、画面の上向きが正)
+    def heading(self, index: int) -> float:
+        return 0.0
+
+
+# 曲線レール: 点列を連続した float32 配列 (N, 2) で持つ
+# 各点の進行方向も作るときに一度だけ計算しておく
+class ArrayRail:
+    __slots__ = ("points", "headings")
+
+    def __init__(self, points: np.ndarray) -> None:
+        self.points: np.ndarray = np.ascontiguousarray(points, dtype=np.float32)
+        self.headings: np.ndarray = self._headings(self.points)
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def __getitem__(self, index: int) -> Coord:
+        (x, y) = self.points[index].tolist()
+        return (x, y)
+
+    def __iter__(self) -> Iterator[Coord]:
+        for x, y in self.points.tolist():
+            yield (x, y)
+
+    def heading(self, index: int) -> float:
+        return float(self.headings[index])
+
+    @staticmethod
+    def _headings(points: np.ndarray) -> np.ndarray:
+        if len(points) < 2:
+            return np.zeros(len(points), dtype=np.float32)
+        (dx, dy) = np.gradient(points.astype(np.float64), axis=0).T
+        return np.degrees(np.arctan2(-dy, dx)).astype(np.float32)
@@ -0,0 +1,288 @@
+import json
+import queue
+import struct
+import threading
+import numpy as np
+from pathlib import Path
+from typing import Any, BinaryIO, Optional, Union
+from .graph import LineGraph
+from .type_hint import Color
+
+# 記録ファイルの形式 (数値はすべてリトルエンディアン)
+#   先頭: MAGIC, メタデータ JSON の長さ (u32), メタデータ JSON
+#   レコード (1 tick に 1 つ): _RECORD (本体の長さ, 種類, tick, 分), 本体
+#     KEY:   全列車の (uid, index, speed) int32 (n, 3),
+#            Unit ごとの上り・下りの現示と前後の分岐器の向き int8 (4m),
+#            制御盤ごとの (progress, arr_track) int32 (2c)
+#     DELTA: 前の tick から変わった列車の数 k (u32), 列車の番号 u32 (k),
+#            その (uid, index, speed) int32 (k, 3),
+#            変わった現示・分岐器の数 s (u32), 位置 u32 (s), 値 int8 (s),
+#            制御盤が変わったか (u8) と、変わったときだけ制御盤の値 int32 (2c)
+#   索引: 分ごとの、その分の最初のキーフレームの位置 int64 (_MINUTES)。
+#         記録のない分はその前の分と同じ、最初の記録より前は -1
+#   末尾: 索引の位置 (u64), MAGIC
+MAGIC: bytes = b"RPREC\x00\x01\x00"
+KEY: int = 0
+DELTA: int = 1
+_RECORD: struct.Struct = struct.Struct("<IBIH")
+_COUNT: struct.Struct = struct.Struct("<I")
+_TRAILER: struct.Struct = struct.Struct("<Q8s")
+_MINUTES: int = 24 * 60 + 1
+
+# 各列車の (uid, index, speed)
+TrainState = tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+# tick ごとの列車の位置・信号の現示・分岐器の向き・制御盤の進み具合を記録ファイルに書く
+# 分が変わった最初の tick はキーフレーム (全体)、それ以外は前の tick からの差分だけを書く
+# 書き込みは別のスレッドが行うので、record は符号化するだけで戻る
+class Recorder:
+    def __init__(
+        self,
+        path: Union[str, Path],
+        train_ids: list[str],
+        colors: list[Color],
+        n_units: int,
+        n_controls: int,
+    ) -> None:
+        meta = {
+            "trains": [
+                {"id": train_id, "color": list(color)}
+                for (train_id, color) in zip(train_ids, colors)
+            ],
+            "units": n_units,
+            "controls": n_controls,
+        }
+        meta_bytes = json.dumps(meta).encode("utf-8")
+        header = MAGIC + _COUNT.pack(len(meta_bytes)) + meta_bytes
+        self._writer: _Writer = _Writer(open(path, "wb"))
+        self._writer.start()
+        self._writer.put(header)
+        self._offset: int = len(header)
+        self._index: np.ndarray = np.full(_MINUTES, -1, dtype=np.int64)
+        self._last_minutes: int = -1
+        self._state: Optional[np.ndarray] = None
+        self._signs: Optional[np.ndarray] = None
+        self._controls: Optional[np.ndarray] = None
+
+    def record(
+        self,
+        tick: int,
+        curr_minutes: int,
+        trains: TrainState,
+        graph: LineGraph,
+        controls: tuple[int, ...],
+    ) -> None:
+        state = np.stack(trains, axis=1).astype(np.int32)
+        signs = np.concatenate(
+            [graph.up_sign, graph.down_sign, graph.prev_switch, graph.next_switch]
+        ).astype(np.int8)
+        control_values = np.array(controls, dtype=np.int32)
+        if (
+            self._state is None
+            or self._signs is None
+            or self._controls is None
+            or curr_minutes != self._last_minutes
+        ):
+            kind = KEY
+            body = state.tobytes() + signs.tobytes() + control_values.tobytes()
+            self._index[curr_minutes] = self._offset
+            self._last_minutes = curr_minutes
+        else:
+            kind = DELTA
+            trains_changed = np.flatnonzero((state != self._state).any(axis=1))
+            signs_changed = np.flatnonzero(signs != self._signs)
+            controls_changed = not np.array_equal(control_values, self._controls)
+            parts = [
+                _COUNT.pack(len(trains_changed)),
+                trains_changed.astype(np.uint32).tobytes(),
+                state[trains_changed].tobytes(),
+                _COUNT.pack(len(signs_changed)),
+                signs_changed.astype(np.uint32).tobytes(),
+                signs[signs_changed].tobytes(),
+                bytes([controls_changed]),
+            ]
+            if controls_changed:
+                parts.append(control_values.tobytes())
+            body = b"".join(parts)
+        record = _RECORD.pack(len(body), kind, tick, curr_minutes) + body
+        self._writer.put(record)
+        self._offset += len(record)
+        (self._state, self._signs, self._controls) = (state, signs, control_values)
+
+    # 索引と末尾を書き、書き込みのスレッドが書き終えるのを待つ
+    def close(self) -> None:
+        index = self._index
+        if self._last_minutes >= 0:
+            first = int(np.flatnonzero(index >= 0)[0])
+            for minutes in range(first + 1, self._last_minutes + 1):
+                if index[minutes] < 0:
+                    index[minutes] = index[minutes - 1]
+        self._writer.put(index.tobytes() + _TRAILER.pack(self._offset, MAGIC))
+        self._writer.close()
+
+
+class _Writer(threading.Thread):
+    def __init__(self, f: BinaryIO) -> None:
+        super().__init__(name="recorder", daemon=True)
+        self.f: BinaryIO = f
+        self._queue: queue.Queue[Optional[bytes]] = queue.Queue()
+
+    def put(self, data: bytes) -> None:
+        self._queue.put(data)
+
+    def run(self) -> None:
+        while True:
+            data = self._queue.get()
+            if data is None:
+                break
+            self.f.write(data)
+        self.f.close()
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self.join()
+
+
+# 記録ファイルを読み、tick ごとの状態を復元する
+# seek は索引から分の最初のキーフレームに直接飛ぶので、ファイルの長さによらない
+class Recording:
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.f: BinaryIO = open(path, "rb")
+        if self.f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"not a recording: {path}")
+        (meta_size,) = _COUNT.unpack(self.f.read(_COUNT.size))
+        meta: dict[str, Any] = json.loads(self.f.read(meta_size).decode("utf-8"))
+        self.train_ids: list[str] = [train["id"] for train in meta["trains"]]
+        self.colors: list[Color] = [tuple(train["color"]) for train in meta["trains"]]
+        self.n_units: int = meta["units"]
+        self.n_controls: int = meta["controls"]
+        self._start: int = self.f.tell()
+        (self._end, self.index) = self._read_index()
+        minutes = np.flatnonzero(self.index >= 0)
+        if len(minutes) == 0:
+            raise ValueError(f"empty recording: {path}")
+        self.first_minutes: int = int(minutes[0])
+        self.last_minutes: int = int(minutes[-1])
+        n_trains = len(self.train_ids)
+        self.tick: int = 0
+        self.curr_minutes: int = self.first_minutes
+        self.state: np.ndarray = np.zeros((n_trains, 3), dtype=np.int32)
+        self.signs: np.ndarray = np.zeros(4 * self.n_units, dtype=np.int8)
+        self.controls: np.ndarray = np.zeros(2 * self.n_controls, dtype=np.int32)
+        self.seek(self.first_minutes)
+
+    @property
+    def uid(self) -> np.ndarray:
+        return self.state[:, 0]
+
+    @property
+    def index_on_rail(self) -> np.ndarray:
+        return self.state[:, 1]
+
+    @property
+    def speed(self) -> np.ndarray:
+        return self.state[:, 2]
+
+    @property
+    def up_sign(self) -> np.ndarray:
+        return self.signs[: self.n_units]
+
+    @property
+    def down_sign(self) -> np.ndarray:
+        return self.signs[self.n_units : 2 * self.n_units]
+
+    @property
+    def prev_switch(self) -> np.ndarray:
+        return self.signs[2 * self.n_units : 3 * self.n_units]
+
+    @property
+    def next_switch(self) -> np.ndarray:
+        return self.signs[3 * self.n_units :]
+
+    @property
+    def arr_tracks(self) -> tuple[int, ...]:
+        return tuple(self.controls[1::2].tolist())
+
+    # minutes の最初の tick の状態にする (記録のない分はその前の最後のキーフレーム)
+    def seek(self, minutes: int) -> None:
+        minutes = min(max(minutes, self.first_minutes), self.last_minutes)
+        self.f.seek(int(self.index[minutes]))
+        self.step()
+
+    # 次の tick の記録を読んで状態を進める。記録の終わりなら False
+    def step(self) -> bool:
+        if self.f.tell() >= self._end:
+            return False
+        (size, kind, tick, curr_minutes) = _RECORD.unpack(self.f.read(_RECORD.size))
+        body = self.f.read(size)
+        (self.tick, self.curr_minutes) = (tick, curr_minutes)
+        if kind == KEY:
+            self._read_key(body)
+        else:
+            self._read_delta(body)
+        return True
+
+    def close(self) -> None:
+        self.f.close()
+
+    def _read_key(self, body: bytes) -> None:
+        n = self.state.size * 4
+        m = self.signs.size
+        self.state = (
+            np.frombuffer(body, np.int32, self.state.size).reshape(-1, 3).copy()
+        )
+        self.signs = np.frombuffer(body, np.int8, m, n).copy()
+        self.controls = np.frombuffer(body, np.int32, self.controls.size, n + m).copy()
+
+    def _read_delta(self, body: bytes) -> None:
+        offset = 0
+        (k,) = _COUNT.unpack_from(body, offset)
+        offset += _COUNT.size
+        trains = np.frombuffer(body, np.uint32, k, offset)
+        offset += 4 * k
+        self.state[trains] = np.frombuffer(body, np.int32, 3 * k, offset).reshape(-1, 3)
+        offset += 12 * k
+        (s,) = _COUNT.unpack_from(body, offset)
+        offset += _COUNT.size
+        positions = np.frombuffer(body, np.uint32, s, offset)
+        offset += 4 * s
+        self.signs[positions] = np.frombuffer(body, np.int8, s, offset)
+        offset += s
+        if body[offset]:
+            self.controls = np.frombuffer(
+                body, np.int32, self.controls.size, offset + 1
+            ).copy()
+
+    # 末尾から索引を読む。末尾がない (記録中に止まった) ときは、レコードをたどって作り直す
+    def _read_index(self) -> tuple[int, np.ndarray]:
+        self.f.seek(0, 2)
+        size = self.f.tell()
+        if size >= self._start + _MINUTES * 8 + _TRAILER.size:
+            self.f.seek(size - _TRAILER.size)
+            (end, magic) = _TRAILER.unpack(self.f.read(_TRAILER.size))
+            if magic == MAGIC and end + _MINUTES * 8 + _TRAILER.size == size:
+                self.f.seek(end)
+                index = np.frombuffer(self.f.read(_MINUTES * 8), dtype=np.int64)
+                return (end, index.copy())
+        return self._scan_index(size)
+
+    def _scan_index(self, size: int) -> tuple[int, np.ndarray]:
+        index = np.full(_MINUTES, -1, dtype=np.int64)
+        offset = self._start
+        last_minutes = -1
+        while offset + _RECORD.size <= size:
+            self.f.seek(offset)
+            (body_size, kind, _, curr_minutes) = _RECORD.unpack(
+                self.f.read(_RECORD.size)
+            )
+            if offset + _RECORD.size + body_size > size:
+                break
+            if kind == KEY:
+                for minutes in range(last_minutes + 1, curr_minutes):
+                    if last_minutes >= 0:
+                        index[minutes] = index[last_minutes]
+                index[curr_minutes] = offset
+                last_minutes = curr_minutes
+            offset += _RECORD.size + body_size
+        return (offset, index)
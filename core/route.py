@@ -0,0 +1,128 @@
+from bisect import bisect_left
+from typing import Callable
+from .graph import LineGraph
+
+
+# 現在の分岐器の向きに沿って、先頭 Unit から終端まで辿った経路
+# bounds[k]: 先頭 Unit の始点 (後退方向では終点) から k 番目の Unit の境界までの距離
+class _Route:
+    __slots__ = ("uids", "bounds", "positions", "refs")
+
+    def __init__(self, uids: list[int], bounds: list[int]) -> None:
+        self.uids: list[int] = uids
+        self.bounds: list[int] = bounds
+        self.positions: dict[int, int] = {uid: k for (k, uid) in enumerate(uids)}
+        # この経路を引く Unit の数 (0 になったら、どの Unit からも捨てる)
+        self.refs: int = 0
+
+
+# 「Unit + index + 距離」を O(log n) で解決するための索引
+# 経路は問い合わせ時に作られ、分岐器が切り替わるとその分岐器より手前の部分だけ破棄される
+# どの Unit からも引かれなくなった経路は、通る全ての Unit の members から外す
+class RouteIndex:
+    def __init__(self, graph: LineGraph) -> None:
+        self.graph: LineGraph = graph
+        self._forward: dict[int, tuple[_Route, int]] = {}
+        self._backward: dict[int, tuple[_Route, int]] = {}
+        self._forward_members: dict[int, set[_Route]] = {}
+        self._backward_members: dict[int, set[_Route]] = {}
+        graph.switch_listeners.append(self._on_switch)
+
+    # index が Unit の末尾を超えている場合の移動先 (next 方向)
+    def forward(self, uid: int, index: int) -> tuple[int, int]:
+        (route, k) = self._forward.get(uid) or self._build_forward(uid)
+        start = route.bounds[k - 1] if k > 0 else 0
+        pos = start + index
+        j = bisect_left(route.bounds, pos, k + 1)
+        if j == len(route.bounds):
+            raise RuntimeError("行き止まりです。")
+        return (route.uids[j], pos - route.bounds[j - 1])
+
+    # index が負の場合の移動先 (prev 方向)
+    def backward(self, uid: int, index: int) -> tuple[int, int]:
+        (route, k) = self._backward.get(uid) or self._build_backward(uid)
+        pos = route.bounds[k] - index
+        j = bisect_left(route.bounds, pos, k + 1)
+        if j == len(route.bounds):
+            raise RuntimeError("行き止まりです。")
+        return (route.uids[j], route.bounds[j] - pos)
+
+    def _build_forward(self, uid: int) -> tuple[_Route, int]:
+        uids = self._follow(uid, self.graph.next_of)
+        bounds = []
+        total = 0
+        for u in uids:
+            total += int(self.graph.rail_length[u]) - 1
+            bounds.append(total)
+        route = _Route(uids, bounds)
+        self._register(route, self._forward, self._forward_members)
+        return (route, 0)
+
+    def _build_backward(self, uid: int) -> tuple[_Route, int]:
+        uids = self._follow(uid, self.graph.prev_of)
+        bounds = [0]
+        total = 0
+        for u in uids[1:]:
+            total += int(self.graph.rail_length[u]) - 1
+            bounds.append(total)
+        route = _Route(uids, bounds)
+        self._register(route, self._backward, self._backward_members)
+        return (route, 0)
+
+    def _follow(self, uid: int, step: Callable[[int], int]) -> list[int]:
+        uids = [uid]
+        while (uid := step(uid)) >= 0:
+            uids.append(uid)
+            if len(uids) > len(self.graph):
+                raise RuntimeError("経路が循環しています。")
+        return uids
+
+    @classmethod
+    def _register(
+        cls,
+        route: _Route,
+        lookup: dict[int, tuple[_Route, int]],
+        members: dict[int, set[_Route]],
+    ) -> None:
+        for k, uid in enumerate(route.uids):
+            entry = lookup.get(uid)
+            if entry is not None:
+                cls._release(entry[0], members)
+            lookup[uid] = (route, k)
+            route.refs += 1
+            members.setdefault(uid, set()).add(route)
+
+    # 経路を引く Unit が 1 つ減った
+    @staticmethod
+    def _release(route: _Route, members: dict[int, set[_Route]]) -> None:
+        route.refs -= 1
+        if route.refs > 0:
+            return
+        for uid in route.uids:
+            routes = members.get(uid)
+            if routes is not None:
+                routes.discard(route)
+                if not routes:
+                    del members[uid]
+
+    def _on_switch(self, uid: int, is_next: bool) -> None:
+        if is_next:
+            self._invalidate(uid, self._forward, self._forward_members)
+        else:
+            self._invalidate(uid, self._backward, self._backward_members)
+
+    # uid を通る経路のうち、uid 以前の部分だけを無効にする
+    @classmethod
+    def _invalidate(
+        cls,
+        uid: int,
+        lookup: dict[int, tuple[_Route, int]],
+        members: dict[int, set[_Route]],
+    ) -> None:
+        for route in list(members.get(uid, ())):
+            for k in range(route.positions[uid], -1, -1):
+                prefix_uid = route.uids[k]
+                entry = lookup.get(prefix_uid)
+                if entry is not None and entry[0] is route:
+                    del lookup[prefix_uid]
+                    cls._release(route, members)
@@ -0,0 +1,25 @@
+import heapq
+from typing import Optional
+
+
+# 発車時刻をキーにした Train の起床待ち行列 (最小ヒープ)
+class WakeupQueue:
+    def __init__(self) -> None:
+        self._heap: list[tuple[int, int]] = []
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, minutes: int, key: int) -> None:
+        heapq.heappush(self._heap, (minutes, key))
+
+    def peek(self) -> Optional[int]:
+        return self._heap[0][0] if self._heap else None
+
+    # curr_minutes までに起こすべき key を key の昇順で返す
+    def pop_due(self, curr_minutes: int) -> list[int]:
+        due = []
+        while self._heap and self._heap[0][0] <= curr_minutes:
+            due.append(heapq.heappop(self._heap)[1])
+        due.sort()
+        return due
@@ -0,0 +1,59 @@
+from .enums import Sign, UnitSituation
+from .graph import LineGraph
+
+
+# 変化のあった Unit だけを記録し、その Unit と隣接 Unit の信号を再計算する
+class SignalEngine:
+    def __init__(self, graph: LineGraph, section_count: int) -> None:
+        self.graph: LineGraph = graph
+        # 始点・終点の Section 以外の Unit だけが信号を持つ
+        self.has_signal: list[bool] = [
+            0 < section < section_count - 1 for section in graph.section_index
+        ]
+        self.dependents: list[list[int]] = self._create_dependents(graph)
+        self.dirty: set[int] = {
+            uid for uid in range(len(graph)) if self.has_signal[uid]
+        }
+        graph.switch_listeners.append(self._on_switch)
+        graph.unit_listeners.append(self._on_unit_change)
+
+    def update(self) -> None:
+        if not self.dirty:
+            return
+        dirty = self.dirty
+        self.dirty = set()
+        for uid in dirty:
+            if self.has_signal[uid]:
+                self._update_unit(uid)
+
+    def _update_unit(self, uid: int) -> None:
+        unit = self.graph.units[uid]
+        if unit.is_controlled:
+            pass
+        elif unit.situation is UnitSituation.OCCUPIED:
+            unit.up_sign = Sign.RED
+            unit.down_sign = Sign.RED
+        else:
+            unit.up_sign = Sign.GREEN
+            unit.down_sign = Sign.GREEN
+            if unit.next_units[unit.next_index].situation is UnitSituation.OCCUPIED:
+                unit.down_sign = Sign.YELLOW
+            if unit.prev_units[unit.prev_index].situation is UnitSituation.OCCUPIED:
+                unit.up_sign = Sign.YELLOW
+
+    def _on_switch(self, uid: int, is_next: bool) -> None:
+        self.dirty.add(uid)
+
+    def _on_unit_change(self, uid: int) -> None:
+        self.dirty.update(self.dependents[uid])
+
+    # uid の状態で信号が変わる Unit: 自分自身と、uid を prev/next の候補に持つ Unit
+    @staticmethod
+    def _create_dependents(graph: LineGraph) -> list[list[int]]:
+        dependents: list[list[int]] = [[uid] for uid in range(len(graph))]
+        for uid in range(len(graph)):
+            for target in graph.prev_candidates(uid).tolist():
+                dependents[target].append(uid)
+            for target in graph.next_candidates(uid).tolist():
+                dependents[target].append(uid)
+        return dependents
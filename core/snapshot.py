@@ -0,0 +1,145 @@
+import numpy as np
+from multiprocessing import shared_memory
+from typing import Optional
+from .pose import Poses, lerp_poses
+
+
+# 描画に必要なシミュレーションの状態を、ある tick の時点で写し取ったもの
+# 作ったあとは変更しない (配列も書き込み禁止にする) ので、別のスレッドからそのまま読める
+class Snapshot:
+    __slots__ = (
+        "tick",
+        "curr_minutes",
+        "prev_poses",
+        "poses",
+        "up_sign",
+        "down_sign",
+        "arr_tracks",
+        "alpha",
+        "stamp",
+    )
+
+    def __init__(
+        self,
+        tick: int,
+        curr_minutes: int,
+        prev_poses: Poses,
+        poses: Poses,
+        up_sign: np.ndarray,
+        down_sign: np.ndarray,
+        arr_tracks: tuple[int, ...],
+        alpha: float = 1.0,
+        stamp: float = 0.0,
+    ) -> None:
+        self.tick: int = tick
+        self.curr_minutes: int = curr_minutes
+        # 直前の tick と、この tick の各車両の (x, y, 向き)
+        self.prev_poses: Poses = _frozen(*prev_poses)
+        self.poses: Poses = _frozen(*poses)
+        # 閉塞ごとの信号の現示 (SIGN_CODES)
+        (self.up_sign, self.down_sign) = _frozen(up_sign, down_sign)
+        # 制御盤ごとの、進路を開いている番線
+        self.arr_tracks: tuple[int, ...] = arr_tracks
+        # 写し取った時点で、次の tick までどこまで時間が進んでいたか (0〜1) と、
+        # その時刻 (time.monotonic。別のプロセスで写し取っても比べられる)
+        self.alpha: float = alpha
+        self.stamp: float = stamp
+
+    # alpha = 0 で前の tick、1 でこの tick の姿勢
+    def lerp(self, alpha: float) -> Poses:
+        return lerp_poses(self.prev_poses, self.poses, alpha)
+
+
+# 共有メモリ上の、最新の Snapshot 1 つ分の置き場と、描画側からの指示
+# 別のプロセスで進めるシミュレーションが write し、描画側が read する
+# 読み書きは呼び出し側がロックで囲む (どちらも配列を写すだけなので短い)
+# layout: (列車数, 1 編成の両数, Unit 数, 制御盤の数)
+class SharedSnapshot:
+    # flags の添字: 速さの倍率, 早送り, 止める (描画側 -> シミュレーション), 終わった (逆向き)
+    SPEED: int = 0
+    FAST_FORWARD: int = 1
+    STOP: int = 2
+    OVER: int = 3
+
+    def __init__(
+        self, layout: tuple[int, int, int, int], name: Optional[str] = None
+    ) -> None:
+        (n_trains, n_cars, n_units, n_controls) = layout
+        self.layout: tuple[int, int, int, int] = layout
+        fields: list[tuple[str, type, tuple[int, ...]]] = [
+            # tick, 分, alpha, stamp
+            ("header", np.float64, (4,)),
+            ("flags", np.float64, (4,)),
+            ("arr_tracks", np.int64, (n_controls,)),
+            # 前の tick の (x, y, 向き) と、この tick の (x, y, 向き)
+            ("poses", np.float32, (6, n_trains, n_cars)),
+            ("signs", np.int8, (2, n_units)),
+        ]
+        offsets = []
+        size = 0
+        for _, dtype, shape in fields:
+            offsets.append(size)
+            size += -(-np.dtype(dtype).itemsize * int(np.prod(shape)) // 8) * 8
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name: str = self.shm.name
+        arrays = {
+            key: np.ndarray(shape, dtype, self.shm.buf, offset)
+            for ((key, dtype, shape), offset) in zip(fields, offsets)
+        }
+        self.header: np.ndarray = arrays["header"]
+        self.flags: np.ndarray = arrays["flags"]
+        self.arr_tracks: np.ndarray = arrays["arr_tracks"]
+        self.poses: np.ndarray = arrays["poses"]
+        self.signs: np.ndarray = arrays["signs"]
+        if name is None:
+            # まだ何も書かれていない
+            self.header[0] = -1
+
+    # 書かれている Snapshot の tick (まだなければ -1)
+    @property
+    def tick(self) -> int:
+        return int(self.header[0])
+
+    def write(self, snapshot: Snapshot) -> None:
+        self.header[:] = (
+            snapshot.tick,
+            snapshot.curr_minutes,
+            snapshot.alpha,
+            snapshot.stamp,
+        )
+        self.arr_tracks[:] = snapshot.arr_tracks
+        self.poses[:3] = snapshot.prev_poses
+        self.poses[3:] = snapshot.poses
+        self.signs[0] = snapshot.up_sign
+        self.signs[1] = snapshot.down_sign
+
+    def read(self) -> Snapshot:
+        (tick, curr_minutes, alpha, stamp) = self.header.tolist()
+        return Snapshot(
+            int(tick),
+            int(curr_minutes),
+            (self.poses[0], self.poses[1], self.poses[2]),
+            (self.poses[3], self.poses[4], self.poses[5]),
+            self.signs[0],
+            self.signs[1],
+            tuple(self.arr_tracks.tolist()),
+            alpha,
+            stamp,
+        )
+
+    # 配列の参照を手放してから閉じる (作った側は unlink で共有メモリも消す)
+    def close(self, unlink: bool = False) -> None:
+        del self.header, self.flags, self.arr_tracks, self.poses, self.signs
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def _frozen(*arrays: np.ndarray) -> tuple[np.ndarray, ...]:
+    copies = tuple(array.copy() for array in arrays)
+    for copy in copies:
+        copy.setflags(write=False)
+    return copies
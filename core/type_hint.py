@@ -1,12 +1,11 @@
 from __future__ import annotations
-from typing import TypedDict, Protocol, Literal
+from typing import TypedDict, Protocol, Literal, Iterator, NotRequired, Sequence
 from .enums import Sign, UnitSituation
 
 
 # 型エイリアス
 Coord = tuple[float, float]
 Size = tuple[int, int]
-Rail = list[Coord]
 Color = tuple[int, int, int]
 
 
@@ -33,9 +32,21 @@ class TimetableEntry(TypedDict):
     schedule: list[ScheduleItem]
 
 
+# 等間隔のダイヤ (schedule の時刻は start からの分)
+class PatternDef(TypedDict):
+    trains: list[str]
+    first_number: int
+    number_step: NotRequired[int]
+    start: int
+    end: int
+    interval: int
+    schedule: list[ScheduleItem]
+
+
 class TimetableFile(TypedDict):
     train: list[TrainDef]
     timetable: list[TimetableEntry]
+    patterns: NotRequired[list[PatternDef]]
     starting_stn: list[dict[str, int]]
     terminal_stn: list[dict[str, int]]
 
@@ -59,7 +70,18 @@ class LineFile(TypedDict):
 
 
 # Protocol
+class Rail(Protocol):
+    def __len__(self) -> int: ...
+
+    def __getitem__(self, index: int) -> Coord: ...
+
+    def __iter__(self) -> Iterator[Coord]: ...
+
+    def heading(self, index: int) -> float: ...
+
+
 class UnitLike(Protocol):
+    uid: int
     prev_units: list[UnitLike]
     prev_index: int
     next_units: list[UnitLike]
@@ -81,8 +103,10 @@ class SectionLike(Protocol):
 
 class ControlLike(Protocol):
     sections: list[SectionLike]
-    timetable: list[dict[str, int]]
+    timetable: Sequence[dict[str, int]]
     progress: int
     arr_track: int
 
     def update(self) -> None: ...
+
+    def has_pending_work(self) -> bool: ...
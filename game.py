@@ -0,0 +1,225 @@
+import numpy as np
+from pathlib import Path
+from typing import Iterator, Optional, Union, cast
+from .config_schema import (
+    SCHEMA_LINE,
+    load_and_validate,
+    load_timetable,
+    semantic_checks,
+)
+from .core.module import Train, Line, MiddleUnitBase
+from .core.periodic import PeriodicTimetable
+from .core.pose import PoseBuffer
+from .core.record import Recorder, TrainState
+from .core.fleet import TrainFleet
+from .core.enums import TrainSituation
+from .core.scheduler import WakeupQueue
+from .core.control import Starting4TrackControl, Terminal2TrackControl
+from .core.type_hint import (
+    LineFile,
+    ControlLike,
+    TrainDef,
+    TimetableEntry,
+)
+
+
+class Game:
+    def __init__(self, use_fleet: bool = False) -> None:
+        self.line_file: LineFile = load_and_validate("line.json", SCHEMA_LINE)
+        (self.timetable_file, self.timetable_index) = load_timetable("timetable.json")
+        self.line: Line = semantic_checks(self.line_file, self.timetable_file)
+        # 等間隔のダイヤは、運用と進路設定リストに必要になったときに展開する
+        self.periodic: PeriodicTimetable = PeriodicTimetable(
+            self.timetable_file.get("patterns", [])
+        )
+        entries = {e["number"]: e for e in self.timetable_file["timetable"]}
+        self.starting_control: ControlLike = Starting4TrackControl(
+            self.line.sections,
+            self.periodic.route_orders(self.timetable_file["starting_stn"], entries, 1),
+        )
+        self.terminal_control: ControlLike = Terminal2TrackControl(
+            self.line.sections,
+            self.periodic.route_orders(self.timetable_file["terminal_stn"], entries, 0),
+        )
+        self.trains: list[Train] = []
+        # 配列ベースのエンジン (任意)
+        self.fleet: Optional[TrainFleet] = None
+        # 走行中の Train の番号 (昇順) と、停車中の Train の起床待ち行列
+        self.active: list[int] = []
+        self.wakeups: WakeupQueue = WakeupQueue()
+        # 描画用の車両の姿勢 (track_poses を呼んだときだけ作る)
+        self.poses: Optional[PoseBuffer] = None
+        # tick ごとの状態の記録 (record を呼んだときだけ作る)
+        self.recorder: Optional[Recorder] = None
+        self.set_trains(
+            self._create_train(self.timetable_file["train"], self.timetable_index),
+            use_fleet,
+        )
+
+    def set_trains(self, trains: list[Train], use_fleet: bool = False) -> None:
+        self.trains = trains
+        self.active = []
+        self.wakeups = WakeupQueue()
+        if use_fleet:
+            self.fleet = TrainFleet(self.line, trains)
+        else:
+            self.fleet = None
+            for i, train in enumerate(trains):
+                if train.situation is TrainSituation.MOVING:
+                    self.active.append(i)
+                else:
+                    self._park(i)
+        if self.poses is not None:
+            self.track_poses(self.poses.car_offsets)
+
+    # 以後、tick ごとに各車両の姿勢を poses に記録する
+    def track_poses(self, car_offsets: tuple[int, ...]) -> PoseBuffer:
+        self.poses = PoseBuffer(self.line, len(self.trains), car_offsets)
+        self.poses.capture(self._positions())
+        return self.poses
+
+    # 以後、tick ごとの列車の位置・信号の現示・分岐器の向き・制御盤の進み具合を path に記録する
+    def record(self, path: Union[str, Path]) -> Recorder:
+        self.recorder = Recorder(
+            path,
+            [train.train_id for train in self.trains],
+            [train.color for train in self.trains],
+            len(self.line.graph.units),
+            2,
+        )
+        return self.recorder
+
+    # 各列車の (uid, index, speed)
+    def train_state(self) -> TrainState:
+        if self.fleet is not None:
+            return (self.fleet.uid, self.fleet.index, self.fleet.speed)
+        return (
+            np.array([train.curr_unit.uid for train in self.trains], dtype=np.int64),
+            np.array([train.curr_index for train in self.trains], dtype=np.int64),
+            np.array([train.curr_speed for train in self.trains], dtype=np.int64),
+        )
+
+    def _positions(self) -> Iterator[tuple[MiddleUnitBase, int]]:
+        if self.fleet is None:
+            return ((train.curr_unit, train.curr_index) for train in self.trains)
+        units = self.line.graph.units
+        return (
+            (cast(MiddleUnitBase, units[uid]), index)
+            for (uid, index) in zip(self.fleet.uid.tolist(), self.fleet.index.tolist())
+        )
+
+    def update(self, tick: int, curr_minutes: int) -> None:
+        if tick % 30 == 0:
+            self.starting_control.update()
+            self.terminal_control.update()
+        if self.fleet is not None:
+            self.fleet.update(curr_minutes)
+        else:
+            self._update_trains(curr_minutes)
+        self.line.update_sign()
+        if self.poses is not None:
+            self.poses.capture(self._positions())
+        if self.recorder is not None:
+            self.recorder.record(
+                tick,
+                curr_minutes,
+                self.train_state(),
+                self.line.graph,
+                (
+                    self.starting_control.progress,
+                    self.starting_control.arr_track,
+                    self.terminal_control.progress,
+                    self.terminal_control.arr_track,
+                ),
+            )
+
+    # 走行中の Train も、制御装置・信号の保留中の処理もない状態か
+    def is_idle(self) -> bool:
+        if self.line.signal_engine.dirty:
+            return False
+        if self.starting_control.has_pending_work():
+            return False
+        if self.terminal_control.has_pending_work():
+            return False
+        if self.fleet is not None:
+            return not self.fleet.moving.any()
+        return not self.active
+
+    # 次に発車する Train の時刻 (発車予定がなければ None)
+    def next_event_minutes(self) -> Optional[int]:
+        if self.fleet is not None:
+            return self.fleet.wakeups.peek()
+        return self.wakeups.peek()
+
+    # 走行中の Train と、発車時刻になった Train だけを更新する
+    def _update_trains(self, curr_minutes: int) -> None:
+        due = self.wakeups.pop_due(curr_minutes)
+        if due:
+            self.active = sorted(self.active + due)
+        active = []
+        for i in self.active:
+            train = self.trains[i]
+            train.update(curr_minutes, self.line)
+            if train.situation is TrainSituation.MOVING:
+                active.append(i)
+            else:
+                self._park(i)
+        self.active = active
+
+    # 停車中の Train を次の発車時刻まで更新対象から外す (運用が終わっていれば戻さない)
+    def _park(self, i: int) -> None:
+        dep_time = self.trains[i].next_dep_time
+        if dep_time is not None:
+            self.wakeups.push(dep_time, i)
+
+    # 同じ train_id のダイヤを始発の発車時刻順に並べ、1 本の Train の運用にする
+    def _create_train(
+        self, train_data: list[TrainDef], index: dict[str, list[TimetableEntry]]
+    ) -> list[Train]:
+        trains = []
+        for train in train_data:
+            roster = self.periodic.roster(train["id"], index.get(train["id"], []))
+            if roster:
+                trains.append(Train(self.line.stations, train, roster))
+        return trains
+
+
+class Time:
+    END_MINUTES: int = 24 * 60
+
+    def __init__(self) -> None:
+        self.ticks_per_minute: int = 60
+        self.curr_minutes: int = 358
+
+    @property
+    def is_over(self) -> bool:
+        return self.curr_minutes >= self.END_MINUTES
+
+    def update(self, tick: int) -> None:
+        if tick % self.ticks_per_minute == 0:
+            self.curr_minutes += 1
+
+    # minutes になる tick の直前まで時計を進め、新しい tick を返す
+    def skip_to(self, tick: int, minutes: int) -> int:
+        if minutes <= self.curr_minutes + 1:
+            return tick
+        next_tick = (tick // self.ticks_per_minute + 1) * self.ticks_per_minute
+        target_tick = (
+            next_tick + (minutes - self.curr_minutes - 1) * self.ticks_per_minute
+        )
+        self.curr_minutes = minutes - 1
+        return target_tick - 1
+
+
+def parse_clock(text: str) -> int:
+    hour, sep, minute = text.partition(":")
+    if not sep or not hour.isdigit() or not minute.isdigit():
+        raise ValueError(f"Invalid time (expected HH:MM): {text}")
+    minutes = int(hour) * 60 + int(minute)
+    if int(minute) >= 60 or minutes > Time.END_MINUTES:
+        raise ValueError(f"Time out of range: {text}")
+    return minutes
+
+
+def format_clock(minutes: int) -> str:
+    return f"{minutes // 60:02}:{minutes % 60:02}"
@@ -0,0 +1,68 @@
+import time
+from typing import Optional
+from .game import Game, Time, format_clock
+
+
+class HeadlessRunner:
+    def __init__(
+        self, until_minutes: int, use_fleet: bool = False, skip_idle: bool = False
+    ) -> None:
+        self.until_minutes: int = min(until_minutes, Time.END_MINUTES)
+        self.skip_idle: bool = skip_idle
+        self.time: Time = Time()
+        self.game: Game = Game(use_fleet)
+        self.tick: int = 0
+        self.steps: int = 0
+
+    def run(self) -> float:
+        start = time.perf_counter()
+        while self.time.curr_minutes < self.until_minutes:
+            if self.skip_idle and self.game.is_idle():
+                self._skip()
+            self.tick += 1
+            self.steps += 1
+            self.time.update(self.tick)
+            self.game.update(self.tick, self.time.curr_minutes)
+        return time.perf_counter() - start
+
+    # 次の発車時刻 (なければ終了時刻) まで時計を進める
+    def _skip(self) -> None:
+        minutes = self.game.next_event_minutes()
+        if minutes is None or minutes > self.until_minutes:
+            minutes = self.until_minutes
+        self.tick = self.time.skip_to(self.tick, minutes)
+
+    def report(self, elapsed: float) -> None:
+        rate = self.steps / elapsed if elapsed > 0 else float("inf")
+        print(
+            f"simulated until {format_clock(self.time.curr_minutes)}: "
+            f"{self.steps} of {self.tick} ticks in {elapsed:.3f} s "
+            f"({rate:,.0f} ticks/sec)"
+        )
+        if self.game.fleet is not None:
+            self.game.fleet.sync_trains()
+        for train in self.game.trains:
+            uid = train.curr_unit.uid
+            (sect_index, unit_index) = self.game.line.graph.locate(uid)
+            print(
+                f"  {train.train_id} #{train.number}: {train.situation.name} "
+                f"entry={train.roster_index + 1}/{len(train.roster)} "
+                f"progress={train.progress}/{len(train.schedule) - 1} "
+                f"unit={uid} ({sect_index}, {unit_index}) index={train.curr_index} "
+                f"speed={train.curr_speed}"
+            )
+
+
+def main(
+    until_minutes: int,
+    use_fleet: bool = False,
+    skip_idle: bool = False,
+    record: Optional[str] = None,
+) -> None:
+    runner = HeadlessRunner(until_minutes, use_fleet, skip_idle)
+    if record is not None:
+        runner.game.record(record)
+    elapsed = runner.run()
+    if runner.game.recorder is not None:
+        runner.game.recorder.close()
+    runner.report(elapsed)
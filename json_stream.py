@@ -0,0 +1,117 @@
+import codecs
+import json
+from typing import Any, BinaryIO, Iterator, Optional
+
+
+# JSON のトップレベルのオブジェクトを、ファイル全体を読み込まずに先頭から順に読む
+# (キー, 要素番号, 値) を返す。stream_keys に含まれるキーの配列は要素ごとに返し、
+# それ以外の値は要素番号を None としてまるごと返す
+class JsonObjectStream:
+    CHUNK_SIZE: int = 1 << 16
+    WHITESPACE: str = " \t\r\n"
+    # 途切れうるトークンの最長の長さ ("\\uXXXX" の 6 文字)。バッファの末尾からこの範囲で
+    # 解析が終わったり失敗したりしたら、途切れている可能性がある
+    TOKEN_MAX: int = 6
+
+    def __init__(self, f: BinaryIO) -> None:
+        self.f: BinaryIO = f
+        self.reader = codecs.getincrementaldecoder("utf-8")()
+        self.decoder: json.JSONDecoder = json.JSONDecoder()
+        self.buf: str = ""
+        self.pos: int = 0
+        self.eof: bool = False
+        # 要素ごとに返した配列のキー (空の配列も含む)
+        self.streamed: set[str] = set()
+
+    def members(
+        self, stream_keys: frozenset[str]
+    ) -> Iterator[tuple[str, Optional[int], Any]]:
+        self._expect("{")
+        if self._peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self._value()
+            if not isinstance(key, str):
+                raise self._error("Expecting property name")
+            self._expect(":")
+            if key in stream_keys and self._peek() == "[":
+                self.streamed.add(key)
+                for position, item in enumerate(self._items()):
+                    yield (key, position, item)
+            else:
+                yield (key, None, self._value())
+            if self._peek() == ",":
+                self.pos += 1
+                continue
+            self._expect("}")
+            return
+
+    def _items(self) -> Iterator[Any]:
+        self._expect("[")
+        if self._peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self._value()
+            if self._peek() == ",":
+                self.pos += 1
+                continue
+            self._expect("]")
+            return
+
+    # size 文字ほど (少なくとも CHUNK_SIZE バイト) 読み足す。もう読むものがなければ False
+    def _fill(self, size: int = 0) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(max(size, self.CHUNK_SIZE))
+        if not chunk:
+            self.eof = True
+            self.buf = self.buf[self.pos :] + self.reader.decode(b"", final=True)
+        else:
+            self.buf = self.buf[self.pos :] + self.reader.decode(chunk)
+        self.pos = 0
+        return True
+
+    def _peek(self) -> str:
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in self.WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, char: str) -> None:
+        if self._peek() != char:
+            raise self._error(f"Expecting '{char}'")
+        self.pos += 1
+
+    # 値がバッファの末尾で途切れている可能性があれば、読み足してから解析し直す
+    # 読み足す量は解析し直す量と同じにするので、解析し直す手間は合わせても値の長さに比例する
+    def _value(self) -> Any:
+        self._peek()
+        while True:
+            try:
+                (value, end) = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                if self._truncated(e) and self._fill(len(self.buf) - self.pos):
+                    continue
+                raise
+            # "1." や "1e" で途切れた数は "1" として読めてしまうので、末尾の近くで終わった値も読み直す
+            if end > len(self.buf) - self.TOKEN_MAX and self._fill(
+                len(self.buf) - self.pos
+            ):
+                continue
+            self.pos = end
+            return value
+
+    # 解析の失敗がバッファの末尾で途切れたせいか (それ以外の誤りはすぐに報告する)
+    # 閉じていない文字列は開始位置で、途切れたリテラルや \u エスケープは末尾の数文字前で失敗する
+    def _truncated(self, e: json.JSONDecodeError) -> bool:
+        if e.msg.startswith("Unterminated string"):
+            return True
+        return e.pos >= len(self.buf) - self.TOKEN_MAX
+
+    def _error(self, message: str) -> json.JSONDecodeError:
+        return json.JSONDecodeError(message, self.buf, self.pos)
@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+import pickle
+import sys
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+from .core.module import Line
+from .core.type_hint import LineFile
+
+
+# キャッシュの形式を変えたら上げる
+CACHE_FORMAT: int = 1
+
+# このプロセスで読み込み・構築済みの Line (pickle 済みのバイト列)
+_loaded: dict[str, bytes] = {}
+
+
+def cache_dir() -> Path:
+    if "RAPID_PROJECT_CACHE_DIR" in os.environ:
+        return Path(os.environ["RAPID_PROJECT_CACHE_DIR"])
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "rapid_project"
+
+
+# Line の構築に関わるコード (core パッケージ) が変わればキャッシュも無効にする
+@lru_cache(maxsize=None)
+def code_version() -> str:
+    digest = hashlib.sha256(f"{CACHE_FORMAT}:{sys.version_info[:2]}".encode())
+    core_dir = Path(__file__).resolve().parent / "core"
+    for path in sorted(core_dir.glob("*.py")):
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def cache_key(line_file: LineFile) -> str:
+    content = json.dumps(line_file, sort_keys=True, separators=(",", ":"))
+    digest = hashlib.sha256(content.encode())
+    digest.update(code_version().encode())
+    return digest.hexdigest()
+
+
+# line.json から Line を作る。ディスク上のキャッシュがあれば構築せず、構築はプロセスごとに高々 1 回
+# 呼び出しごとに、状態を共有しない新しい Line を返す
+def load_line(line_file: LineFile) -> Line:
+    key = cache_key(line_file)
+    data = _loaded.get(key) or _read_cache(key)
+    line: Optional[Line] = None
+    if data is not None:
+        try:
+            line = pickle.loads(data)
+        except Exception:
+            line = None  # 壊れたキャッシュは作り直す
+    if line is None:
+        line = Line(line_file)
+        data = pickle.dumps(line, protocol=pickle.HIGHEST_PROTOCOL)
+        _write_cache(key, data)
+    _loaded[key] = data
+    return line
+
+
+def _cache_path(key: str) -> Path:
+    return cache_dir() / f"line-{key}.pickle"
+
+
+def _read_cache(key: str) -> Optional[bytes]:
+    try:
+        return _cache_path(key).read_bytes()
+    except OSError:
+        return None
+
+
+# 書き込みに失敗してもキャッシュなしで動作を続ける
+def _write_cache(key: str, data: bytes) -> None:
+    path = _cache_path(key)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        tmp_path.unlink(missing_ok=True)
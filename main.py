@@ -1,131 +1,202 @@
 import pygame
 import sys
-from .config_schema import (
-    SCHEMA_LINE,
-    SCHEMA_TIMETABLE,
-    load_and_validate,
-    semantic_checks,
-)
+import time
+from typing import Optional
+from .config_schema import SCHEMA_LINE, load_and_validate
+from .game import Game
+from .line_cache import load_line
+from .simulation import Player, Simulation, SimWorker
 from .view.drawer import Drawer, SignalDrawer, Camera
-from .core.module import Train, Line
-from .core.control import Starting4TrackControl, Terminal2TrackControl
-from .core.type_hint import (
-    Color,
-    Size,
-    LineFile,
-    TimetableFile,
-    ControlLike,
-    TrainDef,
-    TimetableEntry,
-)
-
-
-class Game:
-    def __init__(self) -> None:
-        self.line_file: LineFile = load_and_validate("line.json", SCHEMA_LINE)
-        self.timetable_file: TimetableFile = load_and_validate(
-            "timetable.json", SCHEMA_TIMETABLE
-        )
-        semantic_checks(self.line_file, self.timetable_file)
-
-        self.line: Line = Line(self.line_file)
-        self.starting_control: ControlLike = Starting4TrackControl(
-            self.line.sections, self.timetable_file["starting_stn"]
-        )
-        self.terminal_control: ControlLike = Terminal2TrackControl(
-            self.line.sections, self.timetable_file["terminal_stn"]
-        )
-        self.trains: list[Train] = self._create_train(
-            self.timetable_file["train"], self.timetable_file["timetable"]
-        )
-
-    def update(self, tick: int, curr_minutes: int) -> None:
-        if tick % 30 == 0:
-            self.line.update_sign()
-            self.starting_control.update()
-            self.terminal_control.update()
-        for train in self.trains:
-            train.update(curr_minutes, self.line)
-
-    def _create_train(
-        self, train_data: list[TrainDef], timetable_data: list[TimetableEntry]
-    ) -> list[Train]:
-        trains = []
-        for train in train_data:
-            for schedule in timetable_data:
-                if schedule["train_id"] == train["id"]:
-                    trains.append(Train(self.line.stations, train, schedule))
-                    break
-        return trains
-
-
-class Time:
-    def __init__(self) -> None:
-        self.ticks_per_minute: int = 60
-        self.curr_minutes: int = 358
-
-    def update(self, tick: int) -> None:
-        if tick % self.ticks_per_minute == 0:
-            self.curr_minutes += 1
-        if self.curr_minutes >= 24 * 60:
-            pygame.quit()
-            sys.exit()
+from .view.dirty import merge_rects
+from .view.tiles import world_size
+from .core.record import Recording
+from .core.type_hint import Color, Size
 
 
 class Main:
     SCREEN_SIZE: Size = (1920, 1080)
     SCREEN_COLOR: Color = (255, 255, 255)
-    SIM_SIZE: Size = (3840, 1080)
-
-    def __init__(self) -> None:
+    FPS: int = 60
+    # 1〜6 キーで選ぶ速さの倍率
+    SPEEDS: tuple[int, ...] = (1, 2, 5, 10, 30, 60)
+    SPEED_KEYS: tuple[int, ...] = (
+        pygame.K_1,
+        pygame.K_2,
+        pygame.K_3,
+        pygame.K_4,
+        pygame.K_5,
+        pygame.K_6,
+    )
+
+    def __init__(
+        self,
+        full_redraw: bool = False,
+        speed: int = 1,
+        threaded: bool = False,
+        record: Optional[str] = None,
+        replay: Optional[str] = None,
+    ) -> None:
         pygame.init()
         self.screen = pygame.display.set_mode(self.SCREEN_SIZE)
         self.clock = pygame.time.Clock()
 
-        self.camera: Camera = Camera(self.SIM_SIZE, self.SCREEN_SIZE)
-        self.time: Time = Time()
-        self.game: Game = Game()
-
-        self.drawer: Drawer = Drawer(
-            self.SIM_SIZE, self.screen, self.camera, self.game.line, self.game.trains
+        # replay を渡したときは、Game を作らずに記録を再生する
+        self.player: Optional[Player] = None
+        if replay is not None:
+            line = load_line(load_and_validate("line.json", SCHEMA_LINE))
+            recording = Recording(replay)
+            self.player = Player(recording, line, Drawer.CAR_OFFSETS, speed)
+            game = None
+            colors = recording.colors
+            poses = self.player.poses
+        else:
+            game = Game()
+            if record is not None and not threaded:
+                game.record(record)
+            self.simulation: Simulation = Simulation(game, speed)
+            line = game.line
+            colors = [train.color for train in game.trains]
+            poses = game.track_poses(Drawer.CAR_OFFSETS)
+        self.camera: Camera = Camera(
+            world_size(line, Drawer.LINE_WIDTH), self.SCREEN_SIZE
         )
+
+        self.drawer: Drawer = Drawer(self.screen, self.camera, line, colors, poses)
         self.signal_drawer: SignalDrawer = SignalDrawer(
             self.screen,
             self.camera,
-            self.game.line,
-            self.game.starting_control,
-            self.game.terminal_control,
+            line,
+            None if game is None else game.starting_control,
+            None if game is None else game.terminal_control,
         )
 
-        self.tick: int = 0
+        # False なら、前のフレームから変わった範囲だけを描き直して画面に送る
+        self.full_redraw: bool = full_redraw
+        self._camera_state: Optional[tuple[int, int, int]] = None
+        # True なら、シミュレーションを別のプロセスで進め、その Snapshot だけを描く
+        # (記録もそのプロセスが書く)
+        self.worker: Optional[SimWorker] = (
+            SimWorker(self.simulation, Game, record)
+            if threaded and game is not None
+            else None
+        )
 
     def run(self) -> None:
+        if self.worker is not None:
+            self.worker.start()
         while True:
-            self.screen.fill(self.SCREEN_COLOR)
-            self.clock.tick(60)
-            self.tick += 1
-
-            self.time.update(self.tick)
-            self.game.update(self.tick, self.time.curr_minutes)
-
-            self.drawer.draw(self.time.curr_minutes)
-            self.signal_drawer.draw()
+            seconds = self.clock.tick(self.FPS) / 1000
+            if self.player is not None:
+                self.player.advance(seconds)
+            else:
+                if self.worker is None:
+                    self.simulation.advance(seconds)
+                    if self.simulation.time.is_over:
+                        self._quit()
+                else:
+                    self.worker.sync()
+                    if self.worker.is_over:
+                        self._quit()
+
+            self._render()
 
             self.__handle_event()
+
+    def _render(self) -> None:
+        if self.player is not None:
+            # 記録から作った Snapshot を、まだ進めていない時間の割合で補間して描く
+            snapshot = self.player.snapshot()
+            self.drawer.prepare(snapshot.curr_minutes, self.player.alpha, snapshot)
+            self.signal_drawer.prepare(snapshot)
+        elif self.worker is None:
+            # 最新の 2 tick の間を、まだ進めていない時間の割合で補間して描く
+            self.drawer.prepare(
+                self.simulation.time.curr_minutes, self.simulation.alpha
+            )
+            self.signal_drawer.prepare()
+        else:
+            # 公開された Snapshot のあとに過ぎた時間の分だけ、補間を進める
+            snapshot = self.worker.latest
+            elapsed = (time.monotonic() - snapshot.stamp) * self.simulation.speed
+            alpha = min(snapshot.alpha + elapsed / Simulation.TICK_SECONDS, 1.0)
+            self.drawer.prepare(snapshot.curr_minutes, alpha, snapshot)
+            self.signal_drawer.prepare(snapshot)
+        screen_rect = self.screen.get_rect()
+        if self.full_redraw or self._camera_state != self.camera.state:
+            self._camera_state = self.camera.state
+            self._draw(screen_rect)
             pygame.display.flip()
+            return
+        rects = merge_rects(
+            self.drawer.dirty_rects() + self.signal_drawer.dirty_rects(), screen_rect
+        )
+        for rect in rects:
+            self._draw(rect)
+        if rects:
+            pygame.display.update(rects)
+
+    def _draw(self, area: pygame.Rect) -> None:
+        self.screen.set_clip(area)
+        self.screen.fill(self.SCREEN_COLOR, area)
+        self.drawer.draw(area)
+        self.signal_drawer.draw(area)
+        self.screen.set_clip(None)
+
+    def _quit(self) -> None:
+        if self.worker is not None:
+            self.worker.stop()
+        if self.player is not None:
+            self.player.recording.close()
+        elif self.simulation.game.recorder is not None:
+            self.simulation.game.recorder.close()
+        pygame.quit()
+        sys.exit()
 
     def __handle_event(self) -> None:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
+                self._quit()
+            elif event.type != pygame.KEYDOWN:
+                continue
+            elif event.key == pygame.K_q:
+                self.camera.zoom_out()
+            elif event.key == pygame.K_e:
+                self.camera.zoom_in()
+            elif self.player is not None:
+                self.__handle_replay_key(self.player, event.key)
+            elif event.key == pygame.K_f:
+                # F キーで切り替え: 何も動いていない間は次の発車時刻まで時計を進める
+                self.simulation.fast_forward = not self.simulation.fast_forward
+            elif event.key in self.SPEED_KEYS:
+                self.simulation.speed = self.SPEEDS[self.SPEED_KEYS.index(event.key)]
         keys = pygame.key.get_pressed()
         if keys[pygame.K_a]:
             self.camera.move_left()
         elif keys[pygame.K_d]:
             self.camera.move_right()
-
-
-def main() -> None:
-    simulator = Main()
+        if keys[pygame.K_w]:
+            self.camera.move_up()
+        elif keys[pygame.K_s]:
+            self.camera.move_down()
+
+    # 再生中: ← → で 1 分ずつ前後に飛ぶ、スペースで一時停止、1〜6 で速さ
+    def __handle_replay_key(self, player: Player, key: int) -> None:
+        if key == pygame.K_LEFT:
+            player.seek(player.curr_minutes - 1)
+        elif key == pygame.K_RIGHT:
+            player.seek(player.curr_minutes + 1)
+        elif key == pygame.K_SPACE:
+            player.paused = not player.paused
+        elif key in self.SPEED_KEYS:
+            player.speed = self.SPEEDS[self.SPEED_KEYS.index(key)]
+
+
+def main(
+    full_redraw: bool = False,
+    speed: int = 1,
+    threaded: bool = False,
+    record: Optional[str] = None,
+    replay: Optional[str] = None,
+) -> None:
+    simulator = Main(full_redraw, speed, threaded, record, replay)
     simulator.run()
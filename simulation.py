@@ -0,0 +1,296 @@
+import multiprocessing
+import time
+import numpy as np
+from typing import Any, Callable, Iterator, Optional, cast
+from .game import Game, Time
+from .core.module import Line, MiddleUnitBase
+from .core.pose import PoseBuffer
+from .core.record import Recording
+from .core.snapshot import SharedSnapshot, Snapshot
+
+
+# Game を実時間に合わせて固定の刻みで進める
+# 等速で 1 tick = TICK_SECONDS 秒。描画の速さによらずこの刻みで進める
+class Simulation:
+    TICK_SECONDS: float = 1 / 60
+    # 1 回の advance でシミュレーションに使ってよい実時間 (秒)。超えた分の遅れは捨てる
+    FRAME_BUDGET: float = 0.012
+
+    def __init__(self, game: Game, speed: int = 1) -> None:
+        self.game: Game = game
+        self.time: Time = Time()
+        self.tick: int = 0
+        self.speed: int = speed
+        # 何も動いていない間は次の発車時刻まで時計を進める
+        self.fast_forward: bool = False
+        # まだ進めていない実時間 (秒、速さの倍率をかけたもの)
+        self.lag: float = 0.0
+
+    # 最新の 2 tick の間のどこにいるか (まだ進めていない時間の割合)
+    @property
+    def alpha(self) -> float:
+        return min(self.lag / self.TICK_SECONDS, 1.0)
+
+    # 実時間 seconds の間に進むはずの tick を、まとめて進める
+    def advance(self, seconds: float) -> None:
+        self.lag += seconds * self.speed
+        start = time.perf_counter()
+        while self.lag >= self.TICK_SECONDS and not self.time.is_over:
+            # 描画が遅れるたびに仕事が増えて追いつけなくなるのを防ぐため、
+            # 予算を使い切ったら残りの遅れは捨てる
+            if time.perf_counter() - start > self.FRAME_BUDGET:
+                self.lag %= self.TICK_SECONDS
+                break
+            self.lag -= self.TICK_SECONDS
+            self.step()
+
+    def step(self) -> None:
+        if self.fast_forward and self.game.is_idle():
+            self._skip_idle()
+        self.tick += 1
+
+        self.time.update(self.tick)
+        if self.time.is_over:
+            return
+        self.game.update(self.tick, self.time.curr_minutes)
+
+    # 今の状態を写し取る (game.track_poses を呼んでおくこと)
+    def snapshot(self) -> Snapshot:
+        if self.game.poses is None:
+            raise RuntimeError("poses are not tracked.")
+        return Snapshot(
+            self.tick,
+            self.time.curr_minutes,
+            self.game.poses.previous,
+            self.game.poses.current,
+            self.game.line.graph.up_sign,
+            self.game.line.graph.down_sign,
+            (
+                self.game.starting_control.arr_track,
+                self.game.terminal_control.arr_track,
+            ),
+            self.alpha,
+            time.monotonic(),
+        )
+
+    def _skip_idle(self) -> None:
+        minutes = self.game.next_event_minutes()
+        if minutes is None:
+            minutes = Time.END_MINUTES
+        self.tick = self.time.skip_to(self.tick, minutes)
+
+
+# Simulation を別のプロセスで進め、tick をまとめて進めるたびに Snapshot を共有メモリに書く
+# Game.update は純粋な Python なので、同じプロセスのスレッドでは描画と GIL を取り合って
+# どちらも速くならない。別のプロセスなら、シミュレーションは別のコアで進む
+# 描画側は latest を読むだけで Game には触れない。読み書きはロックで囲むので、
+# 読む側は常に 1 tick 分そろった Snapshot を受け取る (書きかけのものは見えない)
+# 子プロセスは factory で Game を作り直す (spawn なので、factory は pickle できること)
+class SimWorker:
+    def __init__(
+        self,
+        simulation: Simulation,
+        factory: Callable[[], Game],
+        record: Optional[str] = None,
+    ) -> None:
+        game = simulation.game
+        if game.poses is None:
+            raise RuntimeError("poses are not tracked.")
+        self.simulation: Simulation = simulation
+        layout = (
+            len(game.poses),
+            len(game.poses.car_offsets),
+            len(game.line.graph.units),
+            2,
+        )
+        self._shared: SharedSnapshot = SharedSnapshot(layout)
+        self._latest: Snapshot = simulation.snapshot()
+        self._latest_tick: int = -1
+        context = multiprocessing.get_context("spawn")
+        self._lock = context.Lock()
+        self._process = context.Process(
+            target=_run_worker,
+            args=(
+                factory,
+                record,
+                game.poses.car_offsets,
+                layout,
+                self._shared.name,
+                self._lock,
+            ),
+            name="simulation",
+            daemon=True,
+        )
+
+    def start(self) -> None:
+        self.sync()
+        self._process.start()
+
+    # 描画側で変えた速さと早送りを、シミュレーションに伝える
+    def sync(self) -> None:
+        flags = self._shared.flags
+        flags[SharedSnapshot.SPEED] = self.simulation.speed
+        flags[SharedSnapshot.FAST_FORWARD] = self.simulation.fast_forward
+
+    # 最新の Snapshot (まだ書かれていなければ、最初の状態)
+    @property
+    def latest(self) -> Snapshot:
+        with self._lock:
+            tick = self._shared.tick
+            if tick >= 0 and tick != self._latest_tick:
+                self._latest = self._shared.read()
+                self._latest_tick = tick
+        return self._latest
+
+    # 1 日が終わったか (子プロセスが途中で落ちたときも、もう進まないので終わりとする)
+    @property
+    def is_over(self) -> bool:
+        if self._process.exitcode is not None:
+            return True
+        return bool(self._shared.flags[SharedSnapshot.OVER])
+
+    def stop(self) -> None:
+        self._shared.flags[SharedSnapshot.STOP] = 1
+        self._process.join()
+        self._shared.close(unlink=True)
+
+
+# 子プロセスの本体。止めるよう言われるか、1 日が終わるまで Simulation を進める
+def _run_worker(
+    factory: Callable[[], Game],
+    record: Optional[str],
+    car_offsets: tuple[int, ...],
+    layout: tuple[int, int, int, int],
+    name: str,
+    lock: Any,
+) -> None:
+    game = factory()
+    if record is not None:
+        game.record(record)
+    game.track_poses(car_offsets)
+    shared = SharedSnapshot(layout, name)
+    flags = shared.flags
+    simulation = Simulation(game, int(flags[SharedSnapshot.SPEED]))
+    try:
+        last = time.monotonic()
+        while not flags[SharedSnapshot.STOP] and not simulation.time.is_over:
+            simulation.speed = int(flags[SharedSnapshot.SPEED])
+            simulation.fast_forward = bool(flags[SharedSnapshot.FAST_FORWARD])
+            now = time.monotonic()
+            tick = simulation.tick
+            simulation.advance(now - last)
+            last = now
+            if simulation.tick != tick:
+                snapshot = simulation.snapshot()
+                with lock:
+                    shared.write(snapshot)
+            # 次の tick までは眠る
+            wait = (simulation.TICK_SECONDS - simulation.lag) / simulation.speed
+            time.sleep(max(wait, 0.001))
+        flags[SharedSnapshot.OVER] = simulation.time.is_over
+    finally:
+        if game.recorder is not None:
+            game.recorder.close()
+        shared.close()
+
+
+# 記録ファイルを Simulation と同じ刻みで再生する。Game は作らず、記録から Snapshot を作る
+# 分単位で前後に飛べる (飛ぶ先のキーフレームは索引から直接読む)
+class Player:
+    TICK_SECONDS: float = Simulation.TICK_SECONDS
+    FRAME_BUDGET: float = Simulation.FRAME_BUDGET
+
+    def __init__(
+        self,
+        recording: Recording,
+        line: Line,
+        car_offsets: tuple[int, ...],
+        speed: int = 1,
+    ) -> None:
+        if recording.n_units != len(line.graph.units):
+            raise ValueError("recording does not match line.json")
+        self.recording: Recording = recording
+        self.line: Line = line
+        self.speed: int = speed
+        # 一時停止中か (記録の終わりに着いたときも止まる)
+        self.paused: bool = False
+        self.lag: float = 0.0
+        self.poses: PoseBuffer = PoseBuffer(line, len(recording.train_ids), car_offsets)
+        self._set_switches()
+        self.poses.capture(self._positions())
+        self._snapshot: Optional[Snapshot] = None
+
+    @property
+    def curr_minutes(self) -> int:
+        return self.recording.curr_minutes
+
+    @property
+    def alpha(self) -> float:
+        return min(self.lag / self.TICK_SECONDS, 1.0)
+
+    def advance(self, seconds: float) -> None:
+        if self.paused:
+            return
+        self.lag += seconds * self.speed
+        start = time.perf_counter()
+        while self.lag >= self.TICK_SECONDS:
+            if time.perf_counter() - start > self.FRAME_BUDGET:
+                self.lag %= self.TICK_SECONDS
+                break
+            self.lag -= self.TICK_SECONDS
+            if not self.step():
+                self.paused = True
+                self.lag = 0.0
+                break
+
+    # 次の tick に進める。記録の終わりなら False
+    def step(self) -> bool:
+        if not self.recording.step():
+            return False
+        self._set_switches()
+        self.poses.capture(self._positions())
+        self._snapshot = None
+        return True
+
+    # minutes の最初の tick に飛ぶ (記録の範囲に丸める)。飛んだ先では補間しない
+    def seek(self, minutes: int) -> None:
+        self.recording.seek(minutes)
+        self._set_switches()
+        self.poses.capture(self._positions())
+        self.poses.capture(self._positions())
+        self.lag = 0.0
+        self._snapshot = None
+
+    # 今の tick の Snapshot (同じ tick の間は作り直さない)
+    def snapshot(self) -> Snapshot:
+        if self._snapshot is None:
+            recording = self.recording
+            self._snapshot = Snapshot(
+                recording.tick,
+                recording.curr_minutes,
+                self.poses.previous,
+                self.poses.current,
+                recording.up_sign,
+                recording.down_sign,
+                recording.arr_tracks,
+            )
+        return self._snapshot
+
+    # 車両の姿勢は分岐器の向きで決まるので、路線の分岐器を記録に合わせる
+    def _set_switches(self) -> None:
+        graph = self.line.graph
+        recording = self.recording
+        for uid in np.flatnonzero(graph.prev_switch != recording.prev_switch).tolist():
+            graph.units[uid].prev_index = int(recording.prev_switch[uid])
+        for uid in np.flatnonzero(graph.next_switch != recording.next_switch).tolist():
+            graph.units[uid].next_index = int(recording.next_switch[uid])
+
+    def _positions(self) -> Iterator[tuple[MiddleUnitBase, int]]:
+        units = self.line.graph.units
+        recording = self.recording
+        return (
+            (cast(MiddleUnitBase, units[uid]), index)
+            for (uid, index) in zip(
+                recording.uid.tolist(), recording.index_on_rail.tolist()
+            )
+        )
@@ -0,0 +1,25 @@
+import pygame
+
+
+# 描き直す範囲をまとめる。重なる矩形は 1 つにし、画面に収まる部分だけを残す
+# 範囲が多すぎる・広すぎるときは、画面全体を 1 つの範囲として返す
+def merge_rects(
+    rects: list[pygame.Rect], screen_rect: pygame.Rect, max_rects: int = 64
+) -> list[pygame.Rect]:
+    if len(rects) > 4 * max_rects:
+        return [screen_rect]
+    merged: list[pygame.Rect] = []
+    for rect in rects:
+        rect = rect.clip(screen_rect)
+        if not rect.width or not rect.height:
+            continue
+        # 重なるものを吸収しなくなるまで広げる
+        i = rect.collidelist(merged)
+        while i != -1:
+            rect.union_ip(merged.pop(i))
+            i = rect.collidelist(merged)
+        merged.append(rect)
+    area = sum(rect.width * rect.height for rect in merged)
+    if len(merged) > max_rects or 2 * area > screen_rect.width * screen_rect.height:
+        return [screen_rect]
+    return merged
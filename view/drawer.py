@@ -1,9 +1,16 @@
-import math
+import numpy as np
 import pygame
 from pathlib import Path
+from typing import Optional, Union
 from ..core.enums import Sign
 from ..core.type_hint import Color, Coord, ControlLike, Size
-from ..core.module import Line, Train
+from ..core.graph import SIGN_CODES, SIGNS, LineGraph
+from ..core.module import Line
+from ..core.pose import PoseBuffer
+from ..core.snapshot import Snapshot
+from .sprite import CarStencils, SpriteCache
+from .tiles import RailTiles
+from .grid import PointGrid, SpatialGrid
 
 
 class Camera:
@@ -13,19 +20,112 @@ class Camera:
         self.sim_size: Size = sim_size
         self.viewport_size: Size = viewport_size
         self.offset_x: int = offset_x
+        self.offset_y: int = 0
+        # 縮小の段階: 0 で等倍、1 段ごとに 1/2。offset は常に 2**zoom_level の倍数
+        self.zoom_level: int = 0
+        # 路線全体が画面に収まる段階まで縮小できる
+        self.max_zoom_level: int = 0
+        while any(
+            sim > view << self.max_zoom_level
+            for (sim, view) in zip(sim_size, viewport_size)
+        ):
+            self.max_zoom_level += 1
+
+    @property
+    def scale(self) -> float:
+        return 1 / (1 << self.zoom_level)
+
+    # 描き直しが必要かを判断するための、見ている範囲の状態
+    @property
+    def state(self) -> tuple[int, int, int]:
+        return (self.offset_x, self.offset_y, self.zoom_level)
 
     @property
     def max_offset(self) -> int:
-        return max(0, self.sim_size[0] - self.viewport_size[0])
+        return self._snap(self.sim_size[0] - (self.viewport_size[0] << self.zoom_level))
+
+    @property
+    def max_offset_y(self) -> int:
+        return self._snap(self.sim_size[1] - (self.viewport_size[1] << self.zoom_level))
 
     def apply(self, pos: Coord) -> Coord:
-        return (pos[0] - self.offset_x, pos[1])
+        return (
+            (pos[0] - self.offset_x) * self.scale,
+            (pos[1] - self.offset_y) * self.scale,
+        )
+
+    # 画面上の矩形に映っている、シミュレーション座標の矩形
+    def world_rect(self, rect: pygame.Rect) -> pygame.Rect:
+        level = self.zoom_level
+        return pygame.Rect(
+            self.offset_x + (rect.x << level),
+            self.offset_y + (rect.y << level),
+            rect.width << level,
+            rect.height << level,
+        )
+
+    # 画面上の矩形に映っている、縮小した層 (段階 zoom_level) の画素の矩形
+    def level_rect(self, rect: pygame.Rect) -> pygame.Rect:
+        level = self.zoom_level
+        return rect.move(self.offset_x >> level, self.offset_y >> level)
+
+    # シミュレーション座標の矩形が映る、画面上の矩形
+    def screen_rect(self, rect: pygame.Rect) -> pygame.Rect:
+        level = self.zoom_level
+        (x, y) = self.apply(rect.topleft)
+        return pygame.Rect(
+            x, y, max(1, rect.width >> level), max(1, rect.height >> level)
+        )
+
+    # 画面全体に映っている、シミュレーション座標の矩形
+    @property
+    def view_rect(self) -> pygame.Rect:
+        return self.world_rect(pygame.Rect(0, 0, *self.viewport_size))
 
     def move_right(self) -> None:
-        self.offset_x = min(self.offset_x + self.MOVE_DX, self.max_offset)
+        dx = self.MOVE_DX << self.zoom_level
+        self.offset_x = min(self.offset_x + dx, self.max_offset)
 
     def move_left(self) -> None:
-        self.offset_x = max(self.offset_x - self.MOVE_DX, 0)
+        dx = self.MOVE_DX << self.zoom_level
+        self.offset_x = max(self.offset_x - dx, 0)
+
+    def move_down(self) -> None:
+        dy = self.MOVE_DX << self.zoom_level
+        self.offset_y = min(self.offset_y + dy, self.max_offset_y)
+
+    def move_up(self) -> None:
+        dy = self.MOVE_DX << self.zoom_level
+        self.offset_y = max(self.offset_y - dy, 0)
+
+    def zoom_out(self) -> None:
+        if self.zoom_level < self.max_zoom_level:
+            self._zoom(self.zoom_level + 1)
+
+    def zoom_in(self) -> None:
+        if self.zoom_level > 0:
+            self._zoom(self.zoom_level - 1)
+
+    # 画面の中心を保ったまま段階を変える
+    def _zoom(self, level: int) -> None:
+        (cx, cy) = self.view_rect.center
+        self.zoom_level = level
+        (width, height) = (size << level for size in self.viewport_size)
+        self.offset_x = min(max(0, self._snap(cx - width // 2)), self.max_offset)
+        self.offset_y = min(max(0, self._snap(cy - height // 2)), self.max_offset_y)
+
+    # 2**zoom_level の倍数に切り上げる (負なら 0)
+    def _snap(self, value: int) -> int:
+        unit = 1 << self.zoom_level
+        return max(0, -(-value // unit) * unit)
+
+
+# 信号機 1 つ分の配置:
+# (位置, 現示を読む (閉塞の uid, 上り/下りの配列名) の組, 進路表示器なら制御盤の番号)
+# 閉塞が複数あるときは、どれかが進行なら進行、それ以外は停止を示す
+Mount = tuple[Coord, tuple[tuple[int, str], ...], Optional[int]]
+# 信号機が示しているもの: 信号機なら現示、進路表示器なら表示している番線 (0 は消灯)
+Aspect = Union[Sign, int]
 
 
 class SignalDrawer:
@@ -34,89 +134,194 @@ class SignalDrawer:
     SIZE: Size = (36, 72)
     Y: tuple[int, int, int, int] = (264, 384, 564, 684)
     R: int = 6
+    GLYPH_MARGIN: int = 8
 
     def __init__(
         self,
         screen,
         camera: Camera,
         line: Line,
-        starting_control: ControlLike,
-        terminal_control: ControlLike,
+        starting_control: Optional[ControlLike] = None,
+        terminal_control: Optional[ControlLike] = None,
     ) -> None:
         self.screen = screen
         self.camera: Camera = camera
         self.line: Line = line
-        self.starting_control: ControlLike = starting_control
-        self.terminal_control: ControlLike = terminal_control
+        # 記録の再生では制御盤がないので、prepare には必ず snapshot を渡す
+        self.starting_control: Optional[ControlLike] = starting_control
+        self.terminal_control: Optional[ControlLike] = terminal_control
         font_path = Path(__file__).resolve().parent.parent / "DSEG7Modern-Bold.ttf"
         self.track_font = pygame.font.Font(str(font_path), 48)
-
-    def draw(self) -> None:
-        self._draw_signal0()
-        self._draw_signal1()
-        self._draw_signal2()
-
-    def _draw_signal0(self) -> None:
-        for i in range(4):
-            sign = self.line.sections[2].units[i].down_sign
-            signal_coord = (self.line.sections[2].units[i].rail[0][0], self.Y[i])
-            self._draw_sign_unit(signal_coord, sign)
-
-        sign1 = self.line.sections[4].units[1].up_sign
-        sign3 = self.line.sections[4].units[3].up_sign
-        if sign1 == Sign.GREEN or sign3 == Sign.GREEN:
+        # 信号機の位置は動かないので、配置と索引は最初に一度だけ作る
+        self.mounts: list[Mount] = self._mounts0() + self._mounts1() + self._mounts2()
+        self._world_rects: list[pygame.Rect] = [
+            self._world_rect(coord) for (coord, _, _) in self.mounts
+        ]
+        self._grid: SpatialGrid = SpatialGrid()
+        for i, world_rect in enumerate(self._world_rects):
+            self._grid.insert(i, world_rect)
+        # 画面上の矩形は、カメラが動いたときだけ求め直す
+        self._rects: list[pygame.Rect] = []
+        self._rects_state: Optional[tuple[int, int, int]] = None
+        # 進路表示器が表示しうる番線 (駅の番線の数まで)
+        self.max_track: int = max(len(units) for units in line.stations.values())
+        # 縮小の段階 -> (全ての現示と番線を並べた絵, 現示 -> 絵の中の矩形)
+        self._atlases: dict[int, tuple[pygame.Surface, dict[Aspect, pygame.Rect]]] = {}
+        self._aspects: list[Aspect] = []
+        self._prev_aspects: list[Aspect] = []
+
+    # 信号機ごとの現示を読む。前のフレームと違うものだけ描き直す
+    # snapshot を渡したときは、路線と制御盤ではなくそこから読む
+    def prepare(self, snapshot: Optional[Snapshot] = None) -> None:
+        self._prev_aspects = self._aspects
+        if snapshot is None:
+            if self.starting_control is None or self.terminal_control is None:
+                raise RuntimeError("controls are not given.")
+            signs: Union[LineGraph, Snapshot] = self.line.graph
+            arr_tracks = (
+                self.starting_control.arr_track,
+                self.terminal_control.arr_track,
+            )
+        else:
+            (signs, arr_tracks) = (snapshot, snapshot.arr_tracks)
+        self._aspects = [
+            self._aspect(mount, signs, arr_tracks) for mount in self.mounts
+        ]
+        if self._rects_state != self.camera.state:
+            self._rects_state = self.camera.state
+            self._rects = [self.camera.screen_rect(rect) for rect in self._world_rects]
+
+    def dirty_rects(self) -> list[pygame.Rect]:
+        if len(self._prev_aspects) != len(self._aspects):
+            return list(self._rects)
+        return [
+            rect
+            for (old, new, rect) in zip(self._prev_aspects, self._aspects, self._rects)
+            if old != new
+        ]
+
+    def draw(self, area: pygame.Rect) -> None:
+        if not self._aspects:
+            return
+        (atlas, cells) = self._atlas(self.camera.zoom_level)
+        for i in self._grid.query(self.camera.world_rect(area)):
+            rect = self._rects[i]
+            if rect.colliderect(area):
+                self.screen.blit(atlas, rect, area=cells[self._aspects[i]])
+
+    def _world_rect(self, signal_coord: Coord) -> pygame.Rect:
+        # 進路表示の数字は信号機の枠から少しはみ出す
+        rect = pygame.Rect(*signal_coord, *self.SIZE)
+        return rect.inflate(self.GLYPH_MARGIN, 0)
+
+    # signs: 閉塞ごとの現示の配列 up_sign / down_sign を持つもの (LineGraph か Snapshot)
+    # arr_tracks: 制御盤ごとの、進路を開いている番線
+    @staticmethod
+    def _aspect(
+        mount: Mount, signs: Union[LineGraph, Snapshot], arr_tracks: tuple[int, ...]
+    ) -> Aspect:
+        (_, units, control) = mount
+        codes = [int(getattr(signs, name)[uid]) for (uid, name) in units]
+        if len(codes) == 1:
+            sign = SIGNS[codes[0]]
+        elif SIGN_CODES[Sign.GREEN] in codes:
             sign = Sign.GREEN
         else:
             sign = Sign.RED
-        track = self.starting_control.arr_track + 1
+        if control is None:
+            return sign
+        # 進路表示器は進行現示のときだけ番線を表示する
+        return arr_tracks[control] + 1 if sign == Sign.GREEN else 0
+
+    def _mounts0(self) -> list[Mount]:
+        mounts: list[Mount] = []
+        for i in range(4):
+            unit = self.line.sections[2].units[i]
+            mounts.append(
+                ((unit.rail[0][0], self.Y[i]), ((unit.uid, "down_sign"),), None)
+            )
+
+        units = (
+            (self.line.sections[4].units[1].uid, "up_sign"),
+            (self.line.sections[4].units[3].uid, "up_sign"),
+        )
         signal_coord = (self.line.sections[4].units[3].rail[-1][0], self.Y[2])
-        self._draw_sign_unit(signal_coord, sign)
+        mounts.append((signal_coord, units, None))
         signal_coord = (signal_coord[0] + self.SIZE[0], signal_coord[1])
-        self._draw_track_unit(signal_coord, sign, track)
+        mounts.append((signal_coord, units, 0))
+        return mounts
 
-    def _draw_signal1(self) -> None:
+    def _mounts1(self) -> list[Mount]:
         unit = self.line.sections[8].units[0]
-        signal_coord = (unit.rail[0][0], self.Y[1])
-        self._draw_sign_unit(signal_coord, unit.down_sign)
+        mount0: Mount = ((unit.rail[0][0], self.Y[1]), ((unit.uid, "down_sign"),), None)
 
         unit = self.line.sections[6].units[1]
         signal_coord = (unit.rail[-self.SIZE[0]][0], self.Y[2])
-        self._draw_sign_unit(signal_coord, unit.up_sign)
+        mount1: Mount = (signal_coord, ((unit.uid, "up_sign"),), None)
+        return [mount0, mount1]
 
-    def _draw_signal2(self) -> None:
+    def _mounts2(self) -> list[Mount]:
+        mounts: list[Mount] = []
         for i in (0, 1):
             unit = self.line.sections[10].units[i + 2]
             signal_coord = (unit.rail[-self.SIZE[0]][0], self.Y[i + 1])
-            self._draw_sign_unit(signal_coord, unit.up_sign)
+            mounts.append((signal_coord, ((unit.uid, "up_sign"),), None))
 
-        sign0 = self.line.sections[10].units[0].down_sign
-        sign1 = self.line.sections[10].units[1].down_sign
-        if sign0 == Sign.GREEN or sign1 == Sign.GREEN:
-            sign = Sign.GREEN
-        else:
-            sign = Sign.RED
-        track = self.terminal_control.arr_track + 1
+        units = (
+            (self.line.sections[10].units[0].uid, "down_sign"),
+            (self.line.sections[10].units[1].uid, "down_sign"),
+        )
         signal_coord = (self.line.sections[10].units[0].rail[0][0], self.Y[1])
-        self._draw_sign_unit(signal_coord, sign)
+        mounts.append((signal_coord, units, None))
         signal_coord = (signal_coord[0] + self.SIZE[0], signal_coord[1])
-        self._draw_track_unit(signal_coord, sign, track)
-
-    def _draw_track_unit(self, signal_coord: Coord, sign: Sign, track: int) -> None:
-        (x, y) = self.camera.apply(signal_coord)
-        pygame.draw.rect(
-            self.screen, self.COLOR, (x, y, *self.SIZE), border_radius=self.R
+        mounts.append((signal_coord, units, 1))
+        return mounts
+
+    # 全ての現示と番線を、段階 level の大きさで横一列に並べて一度だけ描く
+    def _atlas(self, level: int) -> tuple[pygame.Surface, dict[Aspect, pygame.Rect]]:
+        atlas = self._atlases.get(level)
+        if atlas is not None:
+            return atlas
+        aspects: list[Aspect] = [*Sign, *range(self.max_track + 1)]
+        (width, height) = (
+            max(1, (self.SIZE[0] + self.GLYPH_MARGIN) >> level),
+            max(1, self.SIZE[1] >> level),
         )
-        if sign == Sign.GREEN:
+        surface = pygame.Surface((width * len(aspects), height), pygame.SRCALPHA)
+        cells = {}
+        for i, aspect in enumerate(aspects):
+            cell = pygame.Rect(i * width, 0, width, height)
+            cells[aspect] = cell
+            if level:
+                self._draw_dot(surface, cell, aspect)
+            elif isinstance(aspect, Sign):
+                self._draw_sign_unit(surface, cell.topleft, aspect)
+            else:
+                self._draw_track_unit(surface, cell.topleft, aspect)
+        self._atlases[level] = (surface, cells)
+        return (surface, cells)
+
+    def _draw_track_unit(self, surface, pos: tuple[int, int], track: int) -> None:
+        (x, y) = pos
+        x += self.GLYPH_MARGIN // 2
+        pygame.draw.rect(surface, self.COLOR, (x, y, *self.SIZE), border_radius=self.R)
+        if track:
             sign_track_surface = self.track_font.render(
                 str(track), True, (255, 255, 255)
             )
-            self.screen.blit(sign_track_surface, (x - 1, y + 12))
-
-    def _draw_sign_unit(self, signal_coord, sign):
-        (x, y) = self.camera.apply(signal_coord)
-        pygame.draw.rect(
-            self.screen, self.COLOR, (x, y, *self.SIZE), border_radius=self.R
-        )
+            surface.blit(sign_track_surface, (x - 1, y + 12))
+
+    # 縮小表示では枠と現示の色 (進路表示器は枠だけ) の簡略な形で描く
+    def _draw_dot(self, surface, rect: pygame.Rect, aspect: Aspect) -> None:
+        pygame.draw.rect(surface, self.COLOR, rect)
+        if isinstance(aspect, Sign):
+            radius = max(1, min(rect.width, rect.height) // 3)
+            pygame.draw.circle(surface, aspect.value, rect.center, radius)
+
+    def _draw_sign_unit(self, surface, pos: tuple[int, int], sign: Sign) -> None:
+        (x, y) = pos
+        x += self.GLYPH_MARGIN // 2
+        pygame.draw.rect(surface, self.COLOR, (x, y, *self.SIZE), border_radius=self.R)
         if sign == Sign.RED:
             top_color = sign.value
             bottom_color = self.LIGHT_OUT_COLOR
@@ -124,16 +329,20 @@ class SignalDrawer:
             top_color = self.LIGHT_OUT_COLOR
             bottom_color = sign.value
         pygame.draw.circle(
-            self.screen, top_color, (x + self.SIZE[0] // 2, y + self.SIZE[1] // 4), 16
+            surface, top_color, (x + self.SIZE[0] // 2, y + self.SIZE[1] // 4), 16
         )
         pygame.draw.circle(
-            self.screen,
+            surface,
             bottom_color,
             (x + self.SIZE[0] // 2, y + self.SIZE[1] // 4 * 3),
             16,
         )
 
 
+# 画面に映る車両 1 両分: (スプライト、または画素に直接書き込むときは角度の番号, 画面上の矩形)
+Car = tuple[Union[pygame.Surface, int], pygame.Rect]
+
+
 class Drawer:
     LINE_COLOR: Color = (105, 105, 105)
     LINE_WIDTH: int = 6
@@ -145,84 +354,246 @@ class Drawer:
     STN_Y: tuple[int, int] = (384, 564)
     STN_R: int = 6
 
+    # 先頭からの各車両の位置 (レールの添字のずれ)
+    CAR_OFFSETS: tuple[int, int, int] = (TRAIN_SIZE[0] + 2, 0, -TRAIN_SIZE[0] - 2)
+    # 車両の中心から、回転した車両の端までの最大の距離
+    CAR_REACH: int = 60
+    # この段階より縮小したとき、または画面に映る車両がこの数より多いときは
+    # スプライトを使わず、車両を短い線分として画素に直接書き込む
+    LOD_ZOOM_LEVEL: int = 2
+    LOD_CARS: int = 1000
+
     def __init__(
-        self, sim_size: Size, screen, camera: Camera, line: Line, trains: list[Train]
+        self,
+        screen,
+        camera: Camera,
+        line: Line,
+        colors: list[Color],
+        poses: PoseBuffer,
     ) -> None:
         self.screen = screen
         self.camera: Camera = camera
         self.line: Line = line
-        self.trains: list[Train] = trains
+        # 列車ごとの色 (記録の再生では Train がないので、色だけを受け取る)
+        self.colors: list[Color] = colors
+        self.poses: PoseBuffer = poses
         self.font = pygame.font.SysFont(None, 100)
-        self.rail_surface = pygame.Surface(sim_size, pygame.SRCALPHA)
-        self._rail_cache()
-
-    def draw(self, curr_minutes: int) -> None:
-        self._draw_line()
-        self._draw_time(curr_minutes)
-        self._draw_train()
-        self._draw_station()
-
-    def _draw_train(self) -> None:
-        for train in self.trains:
-            self._draw_car(train, self.TRAIN_SIZE[0] + 2)
-            self._draw_car(train, 0)
-            self._draw_car(train, -self.TRAIN_SIZE[0] - 2)
-
-    def _draw_car(self, train: Train, offset: int) -> None:
-        curr_index = train.curr_index + offset
-        curr_unit, curr_index = self.line.get_next_pos(train.curr_unit, curr_index)
-        curr_pos = curr_unit.rail[curr_index]
-
-        next_index = curr_index + int(train.curr_speed * train.direction.value)
-        next_unit, next_index = self.line.get_next_pos(curr_unit, next_index)
-        next_pos = next_unit.rail[next_index]
-
-        dx = next_pos[0] - curr_pos[0]
-        dy = next_pos[1] - curr_pos[1]
-        angle = math.degrees(math.atan2(-dy, dx))
-
-        surface = pygame.Surface(self.TRAIN_SIZE, pygame.SRCALPHA)
-        pygame.draw.rect(
-            surface, train.color, (0, 0, *self.TRAIN_SIZE), border_radius=self.TRAIN_R
+        # 縮小の段階ごとの車両のスプライト (縮小表示では角を丸めない簡略な形)
+        self.sprites: list[SpriteCache] = [
+            SpriteCache(self.TRAIN_SIZE, self.TRAIN_R)
+        ] + [
+            SpriteCache(
+                (
+                    max(2, self.TRAIN_SIZE[0] >> level),
+                    max(1, self.TRAIN_SIZE[1] >> level),
+                ),
+                0,
+            )
+            for level in range(1, camera.max_zoom_level + 1)
+        ]
+        # 画素に直接書き込むときの車両の型 (縮小の段階ごと。幅は車両の 1/16 の細い線分)
+        self.stencils: list[CarStencils] = [
+            CarStencils(
+                (
+                    max(1, self.TRAIN_SIZE[0] >> level),
+                    max(2, self.TRAIN_SIZE[1] >> (level + 4)),
+                )
+            )
+            for level in range(camera.max_zoom_level + 1)
+        ]
+        self.rails: RailTiles = RailTiles(line, self.LINE_COLOR, self.LINE_WIDTH)
+        self.stn_rects: list[pygame.Rect] = [
+            pygame.Rect(station[0].rail[0][0], stn_y, *self.STN_SIZE)
+            for station in self.line.stations.values()
+            for stn_y in self.STN_Y
+        ]
+        self.stn_grid: SpatialGrid = SpatialGrid()
+        for i, stn_rect in enumerate(self.stn_rects):
+            self.stn_grid.insert(i, stn_rect)
+        self.car_grid: PointGrid = PointGrid()
+        # 画素への直接の書き込みは 1 画素 32 ビットの画面を前提にする
+        # (それ以外の深さの画面では、縮小時も車両が多いときもスプライトで描く)
+        self._pixel_writes: bool = screen.get_bytesize() == 4
+        # 列車ごとの色 (画面の画素の値)
+        self._colors: np.ndarray = np.array(
+            [screen.map_rgb(color) for color in colors], dtype=np.uint32
         )
-        rotated_surface = pygame.transform.rotate(surface, angle)
-        (x, y) = self.camera.apply(curr_pos)
-        rect = rotated_surface.get_rect(center=(x, y))
-        self.screen.blit(rotated_surface, rect)
-
-    def _draw_time(self, curr_minutes: int) -> None:
+        # 画面に映る車両 (列車の番号 * 両数 + 何両目) -> 車両
+        self._cars: dict[int, Car] = {}
+        self._prev_cars: dict[int, Car] = {}
+        self._car_blits: list[Car] = []
+        self._car_rects: list[pygame.Rect] = []
+        # 画素に直接書き込む車両の (型, 中心の x, y, 角度の番号, 色)。_car_rects と同じ順
+        # スプライトで描くときは None
+        self._car_pixels: Optional[
+            tuple[CarStencils, np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+        ] = None
+        self._time_str: str = ""
+        self._time_surface = pygame.Surface((0, 0))
+        self._time_rect: pygame.Rect = pygame.Rect(60, 60, 0, 0)
+        self._prev_time_rect: pygame.Rect = self._time_rect
+
+    # 今のフレームで描くものを求める
+    # alpha: 直前の tick から最新の tick までのどこを描くか (0〜1)
+    # snapshot を渡したときは、車両の姿勢を poses ではなくそこから読む
+    def prepare(
+        self, curr_minutes: int, alpha: float = 1.0, snapshot: Optional[Snapshot] = None
+    ) -> None:
+        self._prev_cars = self._cars
+        poses = self.poses if snapshot is None else snapshot
+        (visible, xs, ys, angles) = self._visible_cars(poses, alpha)
+        if self._pixel_writes and (
+            self.camera.zoom_level >= self.LOD_ZOOM_LEVEL
+            or len(visible) > self.LOD_CARS
+        ):
+            self._cars = self._car_points(visible, xs, ys, angles)
+            self._car_blits = []
+        else:
+            self._cars = self._car_sprites(visible, xs, ys, angles)
+            self._car_pixels = None
+            self._car_blits = list(self._cars.values())
+        self._car_rects = [rect for (_, rect) in self._cars.values()]
+        self._prev_time_rect = self._time_rect
         time_str = self._get_time_str(curr_minutes)
-        time_surface = self.font.render(time_str, True, (0, 0, 0))
-        self.screen.blit(time_surface, (60, 60))
+        if time_str != self._time_str:
+            self._time_str = time_str
+            self._time_surface = self.font.render(time_str, True, (0, 0, 0))
+            self._time_rect = self._time_surface.get_rect(topleft=(60, 60))
+
+    # 前のフレームから変わった範囲 (動いた車両の前後の位置と時計)
+    def dirty_rects(self) -> list[pygame.Rect]:
+        rects = []
+        for key, (sprite, rect) in self._cars.items():
+            old = self._prev_cars.get(key)
+            if old is None:
+                rects.append(rect)
+            elif old[0] != sprite or old[1] != rect:
+                rects.append(old[1])
+                rects.append(rect)
+        for key, (_, rect) in self._prev_cars.items():
+            if key not in self._cars:
+                rects.append(rect)
+        if self._time_rect is not self._prev_time_rect:
+            rects.append(self._prev_time_rect)
+            rects.append(self._time_rect)
+        return rects
+
+    # area (画面座標) に重なるものだけを描く
+    def draw(self, area: pygame.Rect) -> None:
+        self._draw_line(area)
+        self._draw_time(area)
+        self._draw_train(area)
+        self._draw_station(area)
+
+    # 車両の姿勢は PoseBuffer から読むだけで、路線はたどらない
+    # 格子の索引で画面の近くにある車両だけを選ぶ
+    # (画面の近くの車両の番号, 全車両の x, y, 向き)
+    def _visible_cars(
+        self, poses: Union[PoseBuffer, Snapshot], alpha: float
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        (xs, ys, angles) = poses.lerp(alpha)
+        (xs, ys, angles) = (xs.ravel(), ys.ravel(), angles.ravel())
+        self.car_grid.build(xs, ys)
+        reach = 2 * self.CAR_REACH
+        visible = self.car_grid.query(self.camera.view_rect.inflate(reach, reach))
+        return (visible, xs, ys, angles)
+
+    def _car_sprites(
+        self, visible: np.ndarray, xs: np.ndarray, ys: np.ndarray, angles: np.ndarray
+    ) -> dict[int, Car]:
+        n_cars = len(self.CAR_OFFSETS)
+        sprites = self.sprites[self.camera.zoom_level]
+        cars = {}
+        for k, x, y, angle in zip(
+            visible.tolist(),
+            xs[visible].tolist(),
+            ys[visible].tolist(),
+            angles[visible].tolist(),
+        ):
+            rotated_surface = sprites.get(self.colors[k // n_cars], angle)
+            center = self.camera.apply((x, y))
+            cars[k] = (rotated_surface, rotated_surface.get_rect(center=center))
+        return cars
+
+    # 全車両の画素の位置をまとめて求めておき、_draw_train で一度に書き込む
+    def _car_points(
+        self, visible: np.ndarray, xs: np.ndarray, ys: np.ndarray, angles: np.ndarray
+    ) -> dict[int, Car]:
+        stencils = self.stencils[self.camera.zoom_level]
+        (x, y) = self.camera.apply((xs[visible], ys[visible]))
+        (x, y) = (np.rint(x).astype(np.int32), np.rint(y).astype(np.int32))
+        index = stencils.index(angles[visible])
+        colors = self._colors[visible // len(self.CAR_OFFSETS)]
+        self._car_pixels = (stencils, x, y, index, colors)
+        reach = stencils.reach
+        side = 2 * reach + 1
+        return {
+            k: (i, pygame.Rect(cx - reach, cy - reach, side, side))
+            for k, i, cx, cy in zip(
+                visible.tolist(), index.tolist(), x.tolist(), y.tolist()
+            )
+        }
+
+    def _draw_train(self, area: pygame.Rect) -> None:
+        hits = area.collidelistall(self._car_rects)
+        if self._car_pixels is None:
+            for i in hits:
+                self.screen.blit(*self._car_blits[i])
+            return
+        if not hits:
+            return
+        (stencils, x, y, index, colors) = self._car_pixels
+        # 画素への書き込みは clip が効かないので、area からはみ出す車両は画素ごとに選ぶ
+        area = area.clip(self.screen.get_rect())
+        whole = [i for i in hits if area.contains(self._car_rects[i])]
+        partial = [i for i in hits if not area.contains(self._car_rects[i])]
+        # 画面の画素を 1 列に並べて、行の幅 (pitch) から添字を求める
+        row = self.screen.get_pitch() // 4
+        pixels = np.asarray(self.screen.get_view("1")).view(np.uint32)
+        if whole:
+            base = y[whole] * row + x[whole]
+            pixels[stencils.offsets(row)[index[whole]] + base[:, None]] = colors[
+                whole, None
+            ]
+        if partial:
+            (dx, dy) = stencils.table
+            xs = x[partial, None] + dx[index[partial]]
+            ys = y[partial, None] + dy[index[partial]]
+            inside = (
+                (xs >= area.left)
+                & (xs < area.right)
+                & (ys >= area.top)
+                & (ys < area.bottom)
+            )
+            pixels[ys[inside] * row + xs[inside]] = np.broadcast_to(
+                colors[partial, None], xs.shape
+            )[inside]
+        del pixels
 
-    def _draw_line(self) -> None:
-        (x, y) = self.camera.apply((0, 0))
-        view_rect = pygame.Rect(
-            -x, y, self.screen.get_width(), self.screen.get_height()
+    def _draw_time(self, area: pygame.Rect) -> None:
+        if self._time_rect.colliderect(area):
+            self.screen.blit(self._time_surface, self._time_rect)
+
+    def _draw_line(self, area: pygame.Rect) -> None:
+        self.rails.blit(
+            self.screen,
+            area.topleft,
+            self.camera.level_rect(area),
+            self.camera.zoom_level,
         )
-        self.screen.blit(self.rail_surface, (0, 0), area=view_rect)
 
-    def _draw_station(self) -> None:
-        for station in self.line.stations.values():
-            stn_x = station[0].rail[0][0]
-            for stn_y in self.STN_Y:
-                (x, y) = self.camera.apply((stn_x, stn_y))
+    def _draw_station(self, area: pygame.Rect) -> None:
+        for i in self.stn_grid.query(self.camera.world_rect(area)):
+            rect = self.camera.screen_rect(self.stn_rects[i])
+            if rect.colliderect(area):
                 pygame.draw.rect(
                     self.screen,
                     self.STN_COLOR,
-                    (x, y, *self.STN_SIZE),
-                    border_radius=self.STN_R,
+                    rect,
+                    border_radius=self.STN_R >> self.camera.zoom_level,
                 )
 
     def _get_time_str(self, curr_minutes: int) -> str:
         hour = curr_minutes // 60
         minute = curr_minutes % 60
         return f"{hour:02}:{minute:02}"
-
-    def _rail_cache(self) -> None:
-        for section in self.line.sections:
-            for unit in section.units:
-                for coord in unit.rail:
-                    pygame.draw.circle(
-                        self.rail_surface, self.LINE_COLOR, coord, self.LINE_WIDTH
-                    )
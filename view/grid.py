@@ -0,0 +1,59 @@
+import numpy as np
+import pygame
+
+
+# 一様格子の空間索引 (大きさのあるもの: 駅・信号機など、動かないもの向け)
+class SpatialGrid:
+    def __init__(self, cell_size: int = 256) -> None:
+        self.cell_size: int = cell_size
+        self.cells: dict[tuple[int, int], list[int]] = {}
+
+    def insert(self, key: int, rect: pygame.Rect) -> None:
+        for cell in self._cells(rect):
+            self.cells.setdefault(cell, []).append(key)
+
+    # rect に重なるセルに入っているもの (key の昇順)
+    def query(self, rect: pygame.Rect) -> list[int]:
+        keys: set[int] = set()
+        for cell in self._cells(rect):
+            keys.update(self.cells.get(cell, ()))
+        return sorted(keys)
+
+    def _cells(self, rect: pygame.Rect) -> list[tuple[int, int]]:
+        size = self.cell_size
+        return [
+            (cx, cy)
+            for cy in range(rect.top // size, (rect.bottom - 1) // size + 1)
+            for cx in range(rect.left // size, (rect.right - 1) // size + 1)
+        ]
+
+
+# 点 (車両の中心など) の一様格子の索引。毎フレーム NumPy でまとめて作り直す
+class PointGrid:
+    # セル番号 = cy * ROW + cx (cx がこの範囲に収まる大きさの路線を想定)
+    ROW: int = 1 << 24
+
+    def __init__(self, cell_size: int = 256) -> None:
+        self.cell_size: int = cell_size
+        self._order: np.ndarray = np.zeros(0, dtype=np.intp)
+        self._ids: np.ndarray = np.zeros(0, dtype=np.int64)
+
+    def build(self, xs: np.ndarray, ys: np.ndarray) -> None:
+        cx = np.floor_divide(xs, self.cell_size).astype(np.int64)
+        cy = np.floor_divide(ys, self.cell_size).astype(np.int64)
+        ids = cy * self.ROW + cx
+        self._order = np.argsort(ids, kind="stable")
+        self._ids = ids[self._order]
+
+    # rect に重なるセルにある点の番号 (昇順)
+    def query(self, rect: pygame.Rect) -> np.ndarray:
+        size = self.cell_size
+        (cx0, cx1) = (rect.left // size, (rect.right - 1) // size)
+        found = []
+        for cy in range(rect.top // size, (rect.bottom - 1) // size + 1):
+            lo = np.searchsorted(self._ids, cy * self.ROW + cx0, side="left")
+            hi = np.searchsorted(self._ids, cy * self.ROW + cx1, side="right")
+            found.append(self._order[lo:hi])
+        if not found:
+            return np.zeros(0, dtype=np.intp)
+        return np.sort(np.concatenate(found))
@@ -0,0 +1,101 @@
+import numpy as np
+import pygame
+from collections import OrderedDict
+from typing import Optional
+from ..core.type_hint import Color, Size
+
+
+# 色と角度 (ANGLE_STEP 度単位に丸めたもの) ごとに回転済みの車両を作り置きする
+# 古いものから捨てて、最大 capacity 枚まで持つ
+class SpriteCache:
+    ANGLE_STEP: int = 2
+
+    def __init__(self, size: Size, radius: int, capacity: int = 512) -> None:
+        self.size: Size = size
+        self.radius: int = radius
+        self.capacity: int = capacity
+        self._sprites: OrderedDict[tuple[Color, int], pygame.Surface] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sprites)
+
+    def get(self, color: Color, angle: float) -> pygame.Surface:
+        key = (tuple(color), round(angle / self.ANGLE_STEP) % (360 // self.ANGLE_STEP))
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self._sprites.move_to_end(key)
+            return sprite
+        sprite = self._render(key[0], key[1] * self.ANGLE_STEP)
+        self._sprites[key] = sprite
+        if len(self._sprites) > self.capacity:
+            self._sprites.popitem(last=False)
+        return sprite
+
+    def _render(self, color: Color, angle: int) -> pygame.Surface:
+        surface = pygame.Surface(self.size, pygame.SRCALPHA)
+        pygame.draw.rect(surface, color, (0, 0, *self.size), border_radius=self.radius)
+        return pygame.transform.rotate(surface, angle)
+
+
+# 縮小表示や車両が多いときに、車両を向きに沿った短い線分として画素に直接書き込むための型
+# 角度 (SpriteCache と同じ ANGLE_STEP 度単位) ごとに、中心からの画素のずれを作り置きする
+class CarStencils:
+    ANGLE_STEP: int = SpriteCache.ANGLE_STEP
+
+    def __init__(self, size: Size) -> None:
+        self.size: Size = size
+        self._reach: int = 0
+        self._table: Optional[tuple[np.ndarray, np.ndarray]] = None
+        self._offsets: dict[int, np.ndarray] = {}
+
+    # 角度 -> ずれの表の行番号
+    def index(self, angles: np.ndarray) -> np.ndarray:
+        n = 360 // self.ANGLE_STEP
+        return np.rint(angles / self.ANGLE_STEP).astype(np.int64) % n
+
+    # (dx, dy): どちらも (角度の数, 画素数)。画素数が足りない行は先頭の画素を繰り返す
+    @property
+    def table(self) -> tuple[np.ndarray, np.ndarray]:
+        if self._table is None:
+            self._table = self._build()
+        return self._table
+
+    # 1 行 row 画素の画面を 1 列に並べたときの、中心からの添字のずれ (角度の数, 画素数)
+    def offsets(self, row: int) -> np.ndarray:
+        offsets = self._offsets.get(row)
+        if offsets is None:
+            (dx, dy) = self.table
+            offsets = dy * row + dx
+            self._offsets[row] = offsets
+        return offsets
+
+    # 中心から、型の端の画素までの最大の距離
+    @property
+    def reach(self) -> int:
+        if self._table is None:
+            self._table = self._build()
+        return self._reach
+
+    def _build(self) -> tuple[np.ndarray, np.ndarray]:
+        (length, width) = self.size
+        # 0.5 画素おきに取れば、回転しても型の中に穴はあかない
+        u = np.arange(length * 2) / 2 - (length - 1) / 2
+        v = np.arange(width * 2) / 2 - (width - 1) / 2
+        (u, v) = (a.ravel() for a in np.meshgrid(u, v))
+        rows = []
+        for step in range(360 // self.ANGLE_STEP):
+            theta = np.radians(step * self.ANGLE_STEP)
+            (cos, sin) = (np.cos(theta), np.sin(theta))
+            # pygame.transform.rotate と同じく、画面上で反時計回りに回す
+            dx = np.rint(u * cos + v * sin).astype(np.int32)
+            dy = np.rint(v * cos - u * sin).astype(np.int32)
+            rows.append(np.unique(np.stack([dx, dy], axis=1), axis=0))
+        k = max(len(row) for row in rows)
+        table = np.array(
+            [
+                np.concatenate([row, row[:1].repeat(k - len(row), axis=0)])
+                for row in rows
+            ]
+        )
+        self._reach = int(np.abs(table).max())
+        return (table[:, :, 0], table[:, :, 1])
@@ -0,0 +1,154 @@
+import numpy as np
+import pygame
+from collections import OrderedDict
+from ..core.module import Line
+from ..core.rail import StraightRail
+from ..core.type_hint import Color, Rail, Size
+
+
+# レールの外接矩形 (min_x, min_y, max_x, max_y)
+def rail_bounds(rail: Rail) -> tuple[float, float, float, float]:
+    if isinstance(rail, StraightRail):
+        return (rail.x0, rail.y0, rail.x0 + rail.length - 1, rail.y0)
+    points = np.asarray(getattr(rail, "points", list(rail)), dtype=np.float32)
+    (x0, y0) = points.min(axis=0).tolist()
+    (x1, y1) = points.max(axis=0).tolist()
+    return (x0, y0, x1, y1)
+
+
+# 路線全体が収まる大きさ (原点から、全レールの外接矩形の右下まで)
+def world_size(line: Line, margin: int = 0) -> Size:
+    (max_x, max_y) = (0.0, 0.0)
+    for section in line.sections:
+        for unit in section.units:
+            if len(unit.rail):
+                (_, _, x, y) = rail_bounds(unit.rail)
+                (max_x, max_y) = (max(max_x, x), max(max_y, y))
+    return (int(max_x) + 1 + margin, int(max_y) + 1 + margin)
+
+
+# レールの層を TILE_SIZE 四方のタイルに分け、画面に映ったときに初めて描く
+# 縮小の段階 level ごとに 1/2**level の大きさで描いたタイルを別に持つ (ミップマップ)
+# 描いたタイルは全段階あわせて max_bytes に収まる枚数まで、古いものから捨てる
+class RailTiles:
+    TILE_SIZE: int = 512
+
+    def __init__(
+        self, line: Line, color: Color, width: int, max_bytes: int = 64 << 20
+    ) -> None:
+        self.color: Color = color
+        self.width: int = width
+        self.capacity: int = max(1, max_bytes // (4 * self.TILE_SIZE**2))
+        self.rails: list[Rail] = []
+        self.bounds: list[tuple[float, float, float, float]] = []
+        # 段階 -> タイル -> そのタイルにかかるレールの番号 (段階ごとに初めて使うときに作る)
+        self._buckets: dict[int, dict[tuple[int, int], list[int]]] = {}
+        self._discs: dict[int, tuple[np.ndarray, np.ndarray]] = {}
+        self._tiles: OrderedDict[tuple[int, int, int], pygame.Surface] = OrderedDict()
+        for section in line.sections:
+            for unit in section.units:
+                if len(unit.rail):
+                    self.rails.append(unit.rail)
+                    self.bounds.append(rail_bounds(unit.rail))
+
+    def __len__(self) -> int:
+        return len(self._tiles)
+
+    # level_rect (段階 level の画素座標) に映るレールを screen の pos に描く
+    def blit(
+        self, screen, pos: tuple[int, int], level_rect: pygame.Rect, level: int = 0
+    ) -> None:
+        size = self.TILE_SIZE
+        buckets = self._buckets_of(level)
+        for ty in range(level_rect.top // size, (level_rect.bottom - 1) // size + 1):
+            for tx in range(
+                level_rect.left // size, (level_rect.right - 1) // size + 1
+            ):
+                if (tx, ty) not in buckets:
+                    continue
+                tile_rect = pygame.Rect(tx * size, ty * size, size, size)
+                area = tile_rect.clip(level_rect)
+                dest = (
+                    pos[0] + area.left - level_rect.left,
+                    pos[1] + area.top - level_rect.top,
+                )
+                area.move_ip(-tile_rect.left, -tile_rect.top)
+                screen.blit(self.tile(level, tx, ty), dest, area=area)
+
+    def tile(self, level: int, tx: int, ty: int) -> pygame.Surface:
+        key = (level, tx, ty)
+        surface = self._tiles.get(key)
+        if surface is not None:
+            self._tiles.move_to_end(key)
+            return surface
+        surface = self._render(level, tx, ty)
+        self._tiles[key] = surface
+        if len(self._tiles) > self.capacity:
+            self._tiles.popitem(last=False)
+        return surface
+
+    def _buckets_of(self, level: int) -> dict[tuple[int, int], list[int]]:
+        buckets = self._buckets.get(level)
+        if buckets is not None:
+            return buckets
+        buckets = {}
+        span = self.TILE_SIZE << level
+        reach = self.width + 1
+        for index, (x0, y0, x1, y1) in enumerate(self.bounds):
+            for ty in range(int(y0 - reach) // span, int(y1 + reach) // span + 1):
+                for tx in range(int(x0 - reach) // span, int(x1 + reach) // span + 1):
+                    buckets.setdefault((tx, ty), []).append(index)
+        self._buckets[level] = buckets
+        return buckets
+
+    # pygame.draw.circle が塗る画素の、中心からのずれ (半径は段階に合わせて縮める)
+    def _disc(self, level: int) -> tuple[np.ndarray, np.ndarray]:
+        disc = self._discs.get(level)
+        if disc is not None:
+            return disc
+        r = max(1, round(self.width / (1 << level)))
+        stamp = pygame.Surface((2 * r + 3, 2 * r + 3), pygame.SRCALPHA)
+        pygame.draw.circle(stamp, self.color, (r + 1, r + 1), r)
+        (dx, dy) = np.nonzero(pygame.surfarray.array_alpha(stamp))
+        disc = (dx - r - 1, dy - r - 1)
+        self._discs[level] = disc
+        return disc
+
+    # タイルにかかる部分の点列 (段階 level のタイル内の整数座標)
+    def _points(self, rail: Rail, level: int, left: int, top: int) -> np.ndarray:
+        reach = self.width + 1
+        span = self.TILE_SIZE << level
+        if isinstance(rail, StraightRail):
+            start = max(0, left - reach - int(rail.x0))
+            stop = min(rail.length, left + span + reach - int(rail.x0))
+            xs = np.arange(start, stop, 1 << level) + int(rail.x0)
+            points = np.stack([xs, np.full_like(xs, int(rail.y0))], axis=1)
+        else:
+            points = np.asarray(getattr(rail, "points", list(rail)), dtype=np.float32)
+            points = points.astype(np.int64)
+            inside = (
+                (points >= (left - reach, top - reach))
+                & (points < (left + span + reach, top + span + reach))
+            ).all(axis=1)
+            points = points[inside]
+        return (points >> level) - (left >> level, top >> level)
+
+    # 各点を中心とする円を、まとめて書き込む
+    def _render(self, level: int, tx: int, ty: int) -> pygame.Surface:
+        size = self.TILE_SIZE
+        span = size << level
+        mask = np.zeros((size, size), dtype=bool)
+        (dx, dy) = self._disc(level)
+        for index in self._buckets_of(level).get((tx, ty), []):
+            points = self._points(self.rails[index], level, tx * span, ty * span)
+            xs = (points[:, 0:1] + dx).ravel()
+            ys = (points[:, 1:2] + dy).ravel()
+            inside = (xs >= 0) & (xs < size) & (ys >= 0) & (ys < size)
+            mask[xs[inside], ys[inside]] = True
+        surface = pygame.Surface((size, size), pygame.SRCALPHA)
+        pixels = pygame.surfarray.pixels3d(surface)
+        pixels[mask] = self.color
+        alpha = pygame.surfarray.pixels_alpha(surface)
+        alpha[mask] = 255
+        del pixels, alpha
+        return surface